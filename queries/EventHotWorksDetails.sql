@@ -3,12 +3,19 @@ SELECT
 	e.name AS event_name,
 	e.created_at,
     es.name AS status,
-    v.email AS email
+    v.email AS email,
+    et.name AS type_name,
+    es.name AS status_name,
+    CASE
+        WHEN v.email ILIKE '%prominence%' THEN 'prominence'
+        WHEN v.email ILIKE '%seatraders%' THEN 'seatraders'
+    END AS recipient_group
     --v.id AS vessel_id,
     --v.name AS vessel_name
 FROM 
 	events e
 LEFT JOIN vessels v ON v.id = e.vessel_id
+LEFT JOIN event_types et ON et.id = e.type_id
 --LEFT JOIN vessel_subtypes vs ON vs.id = v.subtype_id
 LEFT JOIN event_details ed ON ed.event_id = e.id
 LEFT JOIN event_statuses es ON es.id = ed.status_id
@@ -1,8 +1,19 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from pyarrow import csv as pa_csv
 from pathlib import Path
 
-#pd.set_option('display.max_columns', None)
-pd.set_option('display.max_rows', None)
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
 
 # ---------------------------------------
 # Project Structure
@@ -14,15 +25,8 @@ LOGS_DIR = PROJECT_ROOT / 'logs'
 DATA_DIR = PROJECT_ROOT / 'data'
 MEDIA_DIR = PROJECT_ROOT / 'media'
 
-
-
-def df_from_csv(csv_filepath: str) -> pd.DataFrame:
-    df_raw = pd.read_csv(csv_filepath, na_values=['NULL'], encoding='utf-8')
-    return df_raw
-
-
-def df_after_pivot(df_raw: pd.DataFrame) -> pd.DataFrame:
-    cols_to_keep = [
+# Only these columns are needed for the pivot, the rest are never loaded
+COLS_TO_KEEP = [
     #'vessel_id',
     'vessel',
     'event_id',
@@ -31,23 +35,259 @@ def df_after_pivot(df_raw: pd.DataFrame) -> pd.DataFrame:
     'days_ago',
     #'event_type_id',
     #'event_type_name'
-    ]
-    df_raw = df_raw[cols_to_keep]
-    df = df_raw.pivot_table(
-            index=['vessel'],
-            columns='department_name',
-            values='days_ago',
-            aggfunc=lambda x: x[x < 0].max() if not x[x < 0].empty else x.min()
-    ).reset_index()
+]
+PIVOT_KEYS = ['vessel', 'department_name']
+
+# Declared up front so nothing is inferred as object/int64 and re-copied.
+# Pivot keys are low-cardinality strings: categorical codes keep them compact
+# and let groupby/unstack hash integers instead of Python str objects.
+# days_ago is NULL for events without an end date, and may be fractional
+# (the untyped read inferred float64), hence nullable Float64;
+# event_id is nullable too so a blank id cannot make read_csv raise.
+COL_DTYPES = {
+    'vessel': 'category',
+    'event_id': 'Int32',
+    'department_name': 'category',
+    'days_ago': 'Float64',
+}
+
+# Arrow equivalent of COL_DTYPES: dictionary-encoded strings, narrow ints
+ARROW_COL_TYPES = {
+    'vessel': pa.dictionary(pa.int32(), pa.string()),
+    'event_id': pa.int32(),
+    'department_name': pa.dictionary(pa.int32(), pa.string()),
+    'days_ago': pa.float64(),
+}
+
+# Rows per chunk when streaming the CSV (caps peak memory)
+CHUNKSIZE = 500_000
+
+# Block size for the multithreaded pyarrow CSV reader
+ARROW_BLOCK_SIZE = 16 << 20
+
+
+def df_from_csv(csv_filepath: str, chunksize: int | None = CHUNKSIZE, cols: list = COLS_TO_KEEP):
+    """
+    Stream the CSV as an iterator of DataFrame chunks holding only `cols`;
+    unused columns are skipped by the parser and never enter memory.
+    With chunksize=None the whole file is parsed at once by the multithreaded
+    pyarrow engine into Arrow-backed columns (the pyarrow engine cannot chunk).
+    """
+    dtypes = {col: dtype for col, dtype in COL_DTYPES.items() if col in cols}
+    if chunksize is None:
+        # pyarrow cannot build categories for an all-NULL column: read the keys
+        # as strings and categorize them once the NULLs have been handled
+        categorical = [col for col, dtype in dtypes.items() if dtype == 'category']
+        df = pd.read_csv(
+                csv_filepath,
+                usecols=cols,
+                dtype={**dtypes, **dict.fromkeys(categorical, 'string')},
+                na_values=['NULL'],
+                encoding='utf-8',
+                engine='pyarrow',
+                dtype_backend='pyarrow'
+        )
+        return df.astype(dict.fromkeys(categorical, 'category'))
+    return pd.read_csv(
+            csv_filepath,
+            usecols=cols,
+            dtype=dtypes,
+            na_values=['NULL'],
+            encoding='utf-8',
+            chunksize=chunksize,
+            engine='c'
+    )
+
+
+def _partial_pivot(chunk: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce a chunk to one row per (vessel, department_name) holding the
+    max of the negative days_ago ('neg_max') and the overall min ('min').
+    Both are associative, so partials from different chunks can be combined.
+    """
+    days_ago = chunk['days_ago']
+    masked = chunk.assign(days_ago_neg=days_ago.where(days_ago < 0))
+    g = masked.groupby(PIVOT_KEYS, sort=False, observed=True)
+    return g.agg(neg_max=('days_ago_neg', 'max'), min=('days_ago', 'min'))
+
+
+def _is_integral(days_ago: pd.Series) -> bool:
+    """True when days_ago has no NULLs and only whole numbers (pivot_table then saw an int64 column)"""
+    return not days_ago.hasnans and bool((days_ago % 1 == 0).all())
+
+
+def _baseline_layout(df: pd.DataFrame, integral: bool) -> pd.DataFrame:
+    """
+    Bring a wide pivot to the layout pivot_table used to return: vessels and
+    departments without any days_ago dropped (dropna=True), rows and columns
+    sorted, an object Vessel column and float64 cells with NaN for no value.
+    Like pivot_table, cells stay int64 when days_ago was `integral` and no cell is empty.
+    """
+    df = df.set_index('Vessel').astype('float64')
+    df = df.dropna(how='all').dropna(how='all', axis=1)
+    if integral and not df.isna().to_numpy().any():
+        df = df.astype('int64')
+    df.index = pd.Index(df.index.astype(object), name='Vessel')
+    df.columns = pd.Index(df.columns.astype(object))
+    df = df.sort_index().sort_index(axis=1).reset_index()
     df.columns.name = None
-    df = df.rename(columns={'vessel': 'Vessel'})
     return df
 
 
+def df_after_pivot(chunks) -> pd.DataFrame:
+    """
+    Pivot to one row per vessel and one column per department.
+    Each cell is the most recent upcoming attendance (max negative days_ago)
+    if there is one, else the most recent past attendance (min days_ago).
+
+    Args:
+        chunks: DataFrame or iterable of DataFrame chunks (see df_from_csv)
+    """
+    if isinstance(chunks, pd.DataFrame):
+        # Only cast columns that df_from_csv did not already type (astype copies)
+        recast = {col: dtype for col, dtype in COL_DTYPES.items()
+                  if col in chunks.columns and chunks[col].dtype != dtype}
+        chunks = [chunks.astype(recast) if recast else chunks]
+    integral = True
+    partials = []
+    for chunk in chunks:
+        integral = integral and _is_integral(chunk['days_ago'])
+        partials.append(_partial_pivot(chunk))
+    partials = pd.concat(partials)
+    reduced = partials.groupby(level=PIVOT_KEYS, observed=True).agg({'neg_max': 'max', 'min': 'min'})
+    # A group whose days_ago are all NULL has no value: pivot_table dropped it
+    chosen = reduced['neg_max'].combine_first(reduced['min']).dropna()
+    chosen.index = chosen.index.remove_unused_levels()
+    df = chosen.unstack('department_name').reset_index()
+    df = df.rename(columns={'vessel': 'Vessel'})
+    return _baseline_layout(df, integral)
+
+
+if njit is not None:
+    @njit(parallel=True)
+    def _fused_pivot_kernel(starts, vessel_codes, dept_codes, days, valid, out):
+        """
+        One pass per (vessel, department) run of the sorted rows: track the max
+        negative and the min days_ago together and write the chosen value to
+        out[vessel_code, dept_code]. Runs are disjoint, so prange is race-free.
+        """
+        for r in prange(len(starts) - 1):
+            start, stop = starts[r], starts[r + 1]
+            has_neg = False
+            has_any = False
+            neg_max = 0.0
+            min_days = 0.0
+            for i in range(start, stop):
+                if not valid[i]:
+                    continue
+                v = days[i]
+                if v < 0 and (not has_neg or v > neg_max):
+                    neg_max = v
+                    has_neg = True
+                if not has_any or v < min_days:
+                    min_days = v
+                    has_any = True
+            if has_neg:
+                out[vessel_codes[start], dept_codes[start]] = neg_max
+            elif has_any:
+                out[vessel_codes[start], dept_codes[start]] = min_days
+
+
+def df_after_pivot_numba(df_raw: pd.DataFrame) -> pd.DataFrame:
+    """
+    Same result as df_after_pivot, computed by a numba-compiled fused kernel
+    over the categorical codes (requires numba and a fully loaded DataFrame).
+    """
+    vessel = df_raw['vessel'].astype('category')
+    dept = df_raw['department_name'].astype('category')
+    vessel_codes = vessel.cat.codes.to_numpy(dtype=np.int64)
+    dept_codes = dept.cat.codes.to_numpy(dtype=np.int64)
+    valid = df_raw['days_ago'].notna().to_numpy(dtype=np.bool_)
+    days = df_raw['days_ago'].fillna(0).to_numpy(dtype=np.float64)
+
+    # Drop rows with a missing key, then sort so each group is a contiguous run
+    keep = (vessel_codes >= 0) & (dept_codes >= 0)
+    order = np.lexsort((dept_codes[keep], vessel_codes[keep]))
+    vessel_codes = vessel_codes[keep][order]
+    dept_codes = dept_codes[keep][order]
+    valid = valid[keep][order]
+    days = days[keep][order]
+
+    changed = (np.diff(vessel_codes) != 0) | (np.diff(dept_codes) != 0)
+    starts = np.concatenate(([0], np.flatnonzero(changed) + 1, [len(days)])).astype(np.int64)
+
+    out = np.full((len(vessel.cat.categories), len(dept.cat.categories)), np.nan)
+    if len(days):
+        _fused_pivot_kernel(starts, vessel_codes, dept_codes, days, valid, out)
+
+    # Every category got a row/column in out; _baseline_layout drops the empty ones
+    df = pd.DataFrame(out, index=vessel.cat.categories, columns=list(dept.cat.categories))
+    df = df.rename_axis('Vessel').reset_index()
+    return _baseline_layout(df, _is_integral(df_raw['days_ago']))
+
+
+def arrow_from_csv(csv_filepath: str) -> pa.Table:
+    """
+    Parse the CSV straight into an Arrow table (multithreaded, only COLS_TO_KEEP,
+    dictionary-encoded pivot keys) without building a pandas DataFrame.
+    """
+    return pa_csv.read_csv(
+            csv_filepath,
+            read_options=pa_csv.ReadOptions(block_size=ARROW_BLOCK_SIZE, use_threads=True),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=COLS_TO_KEEP,
+                null_values=['NULL'],
+                # Without this pyarrow keeps 'NULL' vessel/department keys as text
+                strings_can_be_null=True,
+                column_types=ARROW_COL_TYPES
+            )
+    )
+
+
+def df_pivot_duckdb(csv_filepath: str) -> pd.DataFrame:
+    """
+    Same result as df_after_pivot(df_from_csv(...)), but the CSV is parsed by
+    pyarrow and pivoted by DuckDB directly over the Arrow table in a single
+    vectorized plan; pandas only holds the (small) pivoted result.
+    Groups whose days_ago are all NULL are left out, as pivot_table did.
+    """
+    attendances = arrow_from_csv(csv_filepath)
+    df = duckdb.sql("""
+        PIVOT (
+            SELECT
+                vessel,
+                department_name,
+                coalesce(max(days_ago) FILTER (WHERE days_ago < 0), min(days_ago)) AS days_ago
+            FROM attendances
+            WHERE vessel IS NOT NULL AND department_name IS NOT NULL
+            GROUP BY vessel, department_name
+            HAVING count(days_ago) > 0
+        )
+        ON department_name
+        USING first(days_ago)
+        GROUP BY vessel
+        ORDER BY vessel
+    """).df()
+    df = df.rename(columns={'vessel': 'Vessel'})
+    days_ago = attendances.column('days_ago')
+    integral = days_ago.null_count == 0 and pc.all(pc.equal(pc.floor(days_ago), days_ago)).as_py() is not False
+    return _baseline_layout(df, integral)
+
+
 if __name__ == "__main__":
     csv_filepath = DATA_DIR / 'vessel_attendances.csv'
-    df_raw = df_from_csv(csv_filepath)
-    df = df_after_pivot(df_raw)
-    #print(df_raw)
-    print(df)
-
+    if duckdb is not None:
+        df = df_pivot_duckdb(csv_filepath)
+    elif njit is not None:
+        df = df_after_pivot_numba(df_from_csv(csv_filepath, chunksize=None))
+    else:
+        # duckdb is optional: fall back to the streamed pandas pivot
+        chunks = df_from_csv(csv_filepath)
+        df = df_after_pivot(chunks)
+    # Display options only matter for this printout, keep them out of global state
+    with pd.option_context('display.max_rows', None,
+                           'display.max_columns', None,
+                           'display.width', None,
+                           'display.max_colwidth', None):
+        #print(df_raw)
+        print(df)
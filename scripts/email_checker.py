@@ -1,23 +1,87 @@
 import smtplib
+from contextlib import contextmanager
 from email.message import EmailMessage
+from functools import lru_cache
+from types import SimpleNamespace
 from decouple import config
 
-msg = EmailMessage()
-msg["From"] = config("SMTP_USER")
-msg["To"] = config("TEST_EMAIL_RECIPIENT", default="test@example.com")
-msg["Subject"] = "Test Email"
-msg.set_content("This is a test.")
+# Servers cap messages per connection; reconnect before hitting the limit
+MAX_MESSAGES_PER_CONNECTION = 5000
 
-SMTP_HOST=config("SMTP_HOST")
-SMTP_PORT=config("SMTP_PORT", default=25, cast=int)
-SMTP_USER=config("SMTP_USER")
-SMTP_PASS=config("SMTP_PASS")
 
-with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
+@lru_cache(maxsize=1)
+def smtp_cfg() -> SimpleNamespace:
+    """SMTP settings, read from the environment once and reused by every connect"""
+    return SimpleNamespace(
+        host=config("SMTP_HOST"),
+        port=config("SMTP_PORT", default=25, cast=int),
+        user=config("SMTP_USER"),
+        pw=config("SMTP_PASS"),
+    )
+
+
+def _connect() -> smtplib.SMTP:
+    """Open an EHLO'd, STARTTLS'd and logged-in SMTP connection"""
+    cfg = smtp_cfg()
+    smtp = smtplib.SMTP(cfg.host, cfg.port)
     smtp.ehlo()
     smtp.starttls()
     smtp.ehlo()
-    smtp.login(SMTP_USER, SMTP_PASS)
-    smtp.send_message(msg)
+    smtp.login(cfg.user, cfg.pw)
+    return smtp
+
+
+# A dropped link shows up as a disconnect, a 421 reply or a socket error (e.g. reset)
+_CONNECTION_ERRORS = (smtplib.SMTPException, OSError)
+
+
+def _is_alive(smtp: smtplib.SMTP) -> bool:
+    try:
+        return smtp.noop()[0] == 250
+    except _CONNECTION_ERRORS:
+        return False
+
+
+def _close(smtp: smtplib.SMTP) -> None:
+    try:
+        smtp.quit()
+    except _CONNECTION_ERRORS:
+        pass
+
+
+@contextmanager
+def smtp_session():
+    """
+    Yield a send(msg) function that reuses one connection for every message,
+    so the TLS handshake and login are paid once per batch, not per email.
+    The connection is health-checked before each send and reopened if dropped.
+    """
+    smtp = _connect()
+    sent = 0
+
+    def send(msg: EmailMessage) -> None:
+        nonlocal smtp, sent
+        if sent >= MAX_MESSAGES_PER_CONNECTION or not _is_alive(smtp):
+            _close(smtp)
+            smtp = _connect()
+            sent = 0
+        smtp.send_message(msg)
+        sent += 1
+
+    try:
+        yield send
+    finally:
+        _close(smtp)
+
+
+if __name__ == "__main__":
+    msg = EmailMessage()
+    msg["From"] = smtp_cfg().user
+    msg["To"] = config("TEST_EMAIL_RECIPIENT", default="test@example.com")
+    msg["Subject"] = "Test Email"
+    msg.set_content("This is a test.")
+
+    with smtp_session() as send:
+        send(msg)
 
-print("[OK] Email sent successfully!")
+    print("[OK] Email sent successfully!")
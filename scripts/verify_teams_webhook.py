@@ -10,10 +10,11 @@ Usage:
 
 Requirements:
     - TEAMS_WEBHOOK_URL must be set in .env file
-    - pymsteams package must be installed
+    - requests package must be installed
 """
 from decouple import config
-import pymsteams
+import requests
+from requests.adapters import HTTPAdapter
 import sys
 
 TEAMS_WEBHOOK_URL = config('TEAMS_WEBHOOK_URL', default='')
@@ -22,21 +23,32 @@ if not TEAMS_WEBHOOK_URL:
     print("ERROR: TEAMS_WEBHOOK_URL not configured in .env")
     sys.exit(1)
 
+# One pooled session: the TLS connection is reused by every post to the webhook
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
 print(f"Testing webhook: {TEAMS_WEBHOOK_URL[:50]}...")
 
 try:
-    # Create simple test message
-    test_message = pymsteams.connectorcard(TEAMS_WEBHOOK_URL)
-    test_message.title("Test Message from Python")
-    test_message.text("If you can see this message, your webhook is working correctly!")
-    test_message.color("00FF00")  # Green
+    # Create simple test message (MessageCard payload, as send_teams_message posts)
+    payload = {
+        "title": "Test Message from Python",
+        "text": "If you can see this message, your webhook is working correctly!",
+        "themeColor": "00FF00",  # Green
+    }
     
     # Send
-    response = test_message.send()
+    response = session.post(TEAMS_WEBHOOK_URL, json=payload, timeout=60)
+    response.raise_for_status()
+    # Legacy connectors answer HTTP 200 with an error text instead of '1' (as pymsteams checked)
+    if response.status_code == requests.codes.ok and response.text != '1':
+        raise requests.HTTPError(f"Teams webhook did not accept the message: {response.text}", response=response)
     
-    print(f"[OK] Response: {response}")
+    print(f"[OK] Response: {response.status_code}")
     print(f"[OK] Message sent! Check your Teams channel.")
     
 except Exception as e:
     print(f"ERROR: {e}")
     sys.exit(1)
+finally:
+    session.close()
@@ -1,13 +1,30 @@
 # src/db_utils.py
 import os
+import atexit
 from decouple import config
 from contextlib import contextmanager
 from sshtunnel import SSHTunnelForwarder
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects import postgresql
 import pandas as pd
 from pathlib import Path
+from typing import Optional
 import re
 
+# Optional accelerators, imported once at module load
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+try:
+    import connectorx as cx
+except ImportError:
+    cx = None
+
+HAS_CONNECTORX = cx is not None
+
 # Load .env
 SSH_HOST = config('SSH_HOST', default=None)
 SSH_PORT = config('SSH_PORT', default=22, cast=int)
@@ -23,93 +40,190 @@ DB_PASS = config('DB_PASS')
 USE_SSH_TUNNEL = config('USE_SSH_TUNNEL', default=False, cast=bool)
 
 
+# Process-wide SSH tunnel, opened on first use and kept up between queries
+_TUNNEL: Optional[SSHTunnelForwarder] = None
+
+
+def _get_tunnel() -> SSHTunnelForwarder:
+    """
+    Return the shared SSH tunnel, starting it if not yet running (or if it dropped).
+    Key parsing, key exchange and channel setup are paid once per process
+    rather than once per query; the tunnel is stopped at interpreter exit.
+    """
+    global _TUNNEL
+    if _TUNNEL is not None and _TUNNEL.is_active:
+        return _TUNNEL
+
+    if not os.path.exists(SSH_KEY_PATH):
+        raise FileNotFoundError(f"SSH key not found: {SSH_KEY_PATH}")
+    if _TUNNEL is not None:
+        _TUNNEL.stop()
+
+    tunnel = SSHTunnelForwarder(
+            (SSH_HOST, SSH_PORT),
+            ssh_username=SSH_USER,
+            ssh_private_key=SSH_KEY_PATH,
+            remote_bind_address=(DB_HOST, DB_PORT)
+    )
+    tunnel.start()
+    _TUNNEL = tunnel
+    return tunnel
+
+
+# Engines by connection string: each keeps its QueuePool alive between scheduler runs
+_ENGINES: dict = {}
+
+
+def _get_engine(connection_string: str) -> Engine:
+    """
+    Return a cached engine per connection string so its QueuePool (and the
+    open sockets in it) is reused across calls instead of rebuilt every time.
+    Pooled connections are pinged before checkout, recycled after 30 minutes
+    and kept alive with TCP keepalives so idle sockets survive NAT/SSH timeouts.
+    """
+    engine = _ENGINES.get(connection_string)
+    if engine is None:
+        # A new URL means the tunnel came back on another local port: the old pools are dead
+        for stale in _ENGINES.values():
+            stale.dispose()
+        _ENGINES.clear()
+        engine = _ENGINES[connection_string] = create_engine(
+                connection_string,
+                pool_size=5,
+                max_overflow=10,
+                pool_recycle=1800,
+                pool_pre_ping=True,
+                connect_args={'keepalives': 1, 'keepalives_idle': 30}
+        )
+    return engine
+
+
+@atexit.register
+def _stop_tunnel() -> None:
+    """Stop the current SSH tunnel, if any; registered once so reconnects add no exit handlers"""
+    global _TUNNEL
+    if _TUNNEL is not None:
+        _TUNNEL.stop()
+        _TUNNEL = None
+
+
+def close_db() -> None:
+    """
+    Dispose the pooled connections and stop the SSH tunnel (on scheduler shutdown).
+    Both are reopened lazily by the next query.
+    """
+    for engine in _ENGINES.values():
+        engine.dispose()
+    _ENGINES.clear()
+    _stop_tunnel()
+
+
+def _connection_string() -> str:
+    """Build the PostgreSQL URL, routed through the shared SSH tunnel when enabled"""
+    if USE_SSH_TUNNEL and SSH_HOST:
+        tunnel = _get_tunnel()
+        return (
+                f"postgresql://{DB_USER}:{DB_PASS}@"
+                f"localhost:{tunnel.local_bind_port}/{DB_NAME}"
+        )
+    return (
+            f"postgresql://{DB_USER}:{DB_PASS}@"
+            f"{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    )
+
+
+def _connect() -> Engine:
+    """
+    Return the memoized engine for the current connection string (lazily
+    starting the tunnel), so every caller shares the same connection pool.
+    """
+    return _get_engine(_connection_string())
+
+
 def validate_query_file(query_path: Path) -> str:
        """
        Safely load and validate SQL query from file.
        Only accepts .sql files from the queries directory.
        """
-       if not query_path.exists():
-           raise FileNotFoundError(f"Query file not found: {query_path}")
-       
-       if query_path.suffix != '.sql':
-           raise ValueError("Only .sql files are allowed")
-       
-       with open(query_path, 'r', encoding='utf-8') as f:
-           return f.read()
-
-
-def query_to_df(query: str, display_all: bool=True, local: bool=False) -> pd.DataFrame:
-    """Execute query and return DataFrame"""
-    if display_all:
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-        pd.set_option('display.width', None)
-        pd.set_option('display.max_colwidth', None)
-    else:
-        pd.reset_option('display.max_rows')
-        pd.reset_option('display.max_columns')
-        pd.reset_option('display.width')
-        pd.reset_option('display.max_colwidth')
+       # One open + fstat + read: the open doubles as the existence check
+       try:
+           fd = os.open(query_path, os.O_RDONLY)
+       except FileNotFoundError:
+           raise FileNotFoundError(f"Query file not found: {query_path}") from None
+
+       try:
+           if query_path.suffix != '.sql':
+               raise ValueError("Only .sql files are allowed")
+
+           size = os.fstat(fd).st_size
+           return os.read(fd, size).decode('utf-8')
+       finally:
+           os.close(fd)
+
+
+def render_params(query: str, params: dict, backslash_escapes: bool = False) -> str:
+    """
+    Inline :name parameters into the query as SQL literals, quoted by
+    SQLAlchemy's PostgreSQL dialect, for readers that take no bind parameters (connectorx).
+    backslash_escapes must match the server: False for standard_conforming_strings=on
+    (the default since PostgreSQL 9.1), where a backslash in a literal is an ordinary character.
+    """
+    dialect = postgresql.dialect(paramstyle='named')
+    # An unconnected dialect assumes escaping backslashes and would double every one
+    dialect._backslash_escapes = backslash_escapes
+    bound = text(query).bindparams(**params)
+    return str(bound.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+
+
+def _read_sql(query: str, connection_string: str, chunksize: Optional[int] = None,
+              params: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Read query results into a DataFrame.
+    Uses connectorx when installed (binary protocol parsed straight into columnar
+    buffers, no per-row Python tuples), otherwise pandas over SQLAlchemy.
+    With chunksize set, rows are streamed from a server-side cursor chunksize at
+    a time, so the driver never buffers the whole result set client-side.
+    Columns are Arrow-backed (strings and nullable ints without Python objects).
+    """
+    sql = text(query) if params else query
+    if chunksize is not None:
+        engine = _get_engine(connection_string)
+        with engine.connect().execution_options(stream_results=True, yield_per=chunksize) as conn:
+            chunks = pd.read_sql(sql, conn, params=params, chunksize=chunksize, dtype_backend='pyarrow')
+            return pd.concat(chunks, ignore_index=True)
+    if cx is None:
+        engine = _get_engine(connection_string)
+        return pd.read_sql(sql, engine, params=params, dtype_backend='pyarrow')
+    if params:
+        query = render_params(query, params)
+    table = cx.read_sql(connection_string, query, return_type='arrow')
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def query_to_df(query: str, local: bool=False, chunksize: Optional[int]=None,
+                params: Optional[dict]=None) -> pd.DataFrame:
+    """
+    Execute query and return DataFrame.
+    Pass chunksize to stream large results through a server-side cursor.
+    params fills the query's :name placeholders.
+    Display options are left to the caller (see pd.option_context).
+    """
     if local:
-        import duckdb
+        if duckdb is None:
+            raise ImportError("duckdb is required for local queries (pip install duckdb)")
         df = duckdb.query(query).to_df()
         return df
-    if USE_SSH_TUNNEL and SSH_HOST and SSH_KEY_PATH:
-        if not os.path.exists(SSH_KEY_PATH):
-            raise FileNotFoundError(f'SSH key not found: {SSH_KEY_PATH}')
-        with SSHTunnelForwarder(
-                (SSH_HOST, SSH_PORT),
-                ssh_username=SSH_USER,
-                ssh_private_key=SSH_KEY_PATH,
-                remote_bind_address=(DB_HOST, DB_PORT)
-            ) as tunnel:
-            connection_string = (
-                    f"postgresql://{DB_USER}:{DB_PASS}@"
-                    f"localhost:{tunnel.local_bind_port}/{DB_NAME}"
-            )
-            engine = create_engine(connection_string)
-            return pd.read_sql(query, engine)
-    else:
-        connection_string = (
-                f"postgresql://{DB_USER}:{DB_PASS}@"
-                f"{DB_HOST}:{DB_PORT}/{DB_NAME}"
-        )
-        engine = create_engine(connection_string)
-        return pd.read_sql(query, engine)
+    return _read_sql(query, _connection_string(), chunksize, params)
+
 
 @contextmanager
 def get_db_connection():
     """Context manager for database connection with optional SSH tunnel"""
-    if USE_SSH_TUNNEL and SSH_HOST:
-        if not os.path.exists(SSH_KEY_PATH):
-            raise FileNotFoundError(f"SSH key not found: {SSH_KEY_PATH}")
-        with SSHTunnelForwarder(
-                (SSH_HOST, SSH_PORT),
-                ssh_username=SSH_USER,
-                ssh_private_key=SSH_KEY_PATH,
-                remote_bind_address=(DB_HOST, DB_PORT)
-        ) as tunnel:
-            connection_string = (
-                    f"postgresql://{DB_USER}:{DB_PASS}@"
-                    f"localhost:{tunnel.local_bind_port}/{DB_NAME}"
-            )
-            engine = create_engine(connection_string)
-            conn = engine.connect()
-            try:
-                yield conn
-            finally:
-                conn.close()
-    else:
-        connection_string = (
-                f"postgresql://{DB_USER}:{DB_PASS}@"
-                f"{DB_HOST}:{DB_PORT}/{DB_NAME}"
-        )
-        engine = create_engine(connection_string)
-        conn = engine.connect()
-        try:
-            yield conn
-        finally:
-            conn.close()
+    conn = _connect().connect()
+    try:
+        yield conn
+    finally:
+        conn.close()
 
 
 def check_db_connection() -> bool:
@@ -118,32 +232,9 @@ def check_db_connection() -> bool:
     Returns True if successful, False otherwise.
     """
     try:
-        if USE_SSH_TUNNEL and SSH_HOST and SSH_KEY_PATH:
-            if not os.path.exists(SSH_KEY_PATH):
-                raise FileNotFoundError(f"SSH key not found: {SSH_KEY_PATH}")
-            with SSHTunnelForwarder(
-                    (SSH_HOST, SSH_PORT),
-                    ssh_username=SSH_USER,
-                    ssh_private_key=SSH_KEY_PATH,
-                    remote_bind_address=(DB_HOST, DB_PORT)
-            ) as tunnel:
-                connection_string = (
-                        f"postgresql://{DB_USER}:{DB_PASS}@"
-                        f"localhost:{tunnel.local_bind_port}/{DB_NAME}"
-                )
-                engine = create_engine(connection_string)
-                with engine.connect() as conn:
-                    conn.execute(text("SELECT 1"))
-        else:
-            connection_string = (
-                    f"postgresql://{DB_USER}:{DB_PASS}@"
-                    f"{DB_HOST}:{DB_PORT}/{DB_NAME}"
-            )
-            engine = create_engine(connection_string)
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
+        with _connect().connect() as conn:
+            conn.execute(text("SELECT 1"))
         return True
     except Exception as e:
         print(f"Connection failed: {e}")
         return False
-
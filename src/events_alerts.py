@@ -18,28 +18,40 @@ Company-specific elements:
 - Logs to rotating logfile
 - Tracks sent event IDs to prevent duplicate notifications
 """
-from src.db_utils import get_db_connection, validate_query_file
+from src.db_utils import get_db_connection, validate_query_file, query_to_df, render_params, close_db, HAS_CONNECTORX
 from decouple import config
 from sqlalchemy import text
+import numpy as np
 import pandas as pd
 from pandas.errors import DatabaseError
 from datetime import datetime, timedelta
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 import smtplib
 from email.message import EmailMessage
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, MemoryHandler
 import sys
 from pathlib import Path
-import pymsteams
-from typing import Union, List, Set, Dict
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Union, List, Set, Dict, Optional, FrozenSet, Iterable
+import copy
 import json
 import time
 import signal
 import threading
+from concurrent.futures import ThreadPoolExecutor
 import tempfile
-import shutil
+import contextlib
 import os
+import atexit
+
+# Optional C-implemented JSON codec for the tracking file
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # ---------------------------------------
 # Project Structure
@@ -74,12 +86,16 @@ ENABLE_SPECIAL_TEAMS_EMAIL_ALERT = config('ENABLE_SPECIAL_TEAMS_EMAIL_ALERT', de
 SPECIAL_TEAMS_EMAIL = config('SPECIAL_TEAMS_EMAIL', '').strip()
 
 TEAMS_WEBHOOK_URL = config('TEAMS_WEBHOOK_URL', default='')
+TEAMS_HTTP_TIMEOUT = 60  # seconds
 ENABLE_TEAMS_ALERTS = config('ENABLE_TEAMS_ALERTS', default=False, cast=bool)
 ENABLE_EMAIL_ALERTS = config('ENABLE_EMAIL_ALERTS', default=True, cast=bool)
 
 COMPANY_NAME = config('COMPANY_NAME', default='Company')
 COMPANY_LOGO = MEDIA_DIR / config('COMPANY_LOGO', default='')
 ST_COMPANY_LOGO = MEDIA_DIR / config('ST_COMPANY_LOGO', default='')
+# Checked once at startup like the rest of the configuration (restart to pick up new logos)
+HAS_COMPANY_LOGO = COMPANY_LOGO.is_file()
+HAS_ST_LOGO = ST_COMPANY_LOGO.is_file()
 
 # CRITICAL FIX #2: Configurable events base URL instead of hardcoded
 EVENTS_BASE_URL = config('EVENTS_BASE_URL', default='https://prominence.orca.tools/events')
@@ -94,6 +110,7 @@ EVENT_STATUS_ID = int(config('EVENT_STATUS_ID', default=3))       # 3 -> progres
 EVENT_NAME_FILTER = config('EVENT_NAME_FILTER', default='hot')
 EVENT_EXCLUDE = config('EVENT_EXCLUDE', default='vessel')
 EVENT_LOOKBACK_DAYS = int(config('EVENT_LOOKBACK_DAYS', default=17))
+EVENTS_QUERY_CHUNKSIZE = 5000  # rows fetched per round-trip when streaming the events query
 
 # Automation Scheduler Frequency (hours)
 SCHEDULE_FREQUENCY = float(config('SCHEDULE_FREQUENCY', default=1))
@@ -120,10 +137,15 @@ for key, value in required_configs.items():
 # ---------------------------------------
 logger = logging.getLogger('events_alerts')
 logger.setLevel(logging.INFO)
-handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, delay=True)
 formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
 handler.setFormatter(formatter)
-logger.addHandler(handler)
+
+# Buffer file records and write them in batches (flushed on ERROR, at the end of
+# every run, on shutdown signals and at exit); the console stays unbuffered
+buffered_handler = MemoryHandler(capacity=500, flushLevel=logging.ERROR, target=handler, flushOnClose=True)
+logger.addHandler(buffered_handler)
+atexit.register(buffered_handler.flush)
 
 # Also log to console for debugging
 console_handler = logging.StreamHandler(sys.stdout)
@@ -140,6 +162,7 @@ shutdown_event = threading.Event()
 def signal_handler(signum, frame):
     """Handle shutdown signals gracefully"""
     logger.info(f"Received signal {signum}. Initiating graceful shutdown...")
+    buffered_handler.flush()
     shutdown_event.set()
 
 # Register signal handlers
@@ -150,75 +173,140 @@ signal.signal(signal.SIGINT, signal_handler)
 # ---------------------------------------
 # Sent Events Tracking
 # ---------------------------------------
-def load_sent_events() -> dict:
+def _json_dumps(data: dict) -> bytes:
     """
-    Load the dictionary of event IDs that have already been sent with timestamps.
-    Automatically removes events older than REMINDER_FREQUENCY_DAYS.
-    Returns dict with event_id as key and sent_at timestamp as value.
-    Returns an empty dict if file doesn't exist or is corrupted.
+    Encode the tracking file as indented UTF-8 JSON, with orjson when installed.
+    Keys are not re-sorted: save_sent_events already orders event IDs numerically.
+    Int keys are written as strings, like json.dumps does.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def _json_loads(raw):
+    """Decode the tracking file (orjson.JSONDecodeError subclasses json.JSONDecodeError)"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _prune_sent_events(sent_events: dict, now: datetime, days: float) -> dict:
+    """
+    Return the sent events whose timestamp is within `days` of `now`.
+    Entries with a missing or unparseable timestamp are dropped as well.
+    Pure apart from logging: no file I/O, so load_sent_events owns the tracking file.
+    """
+    cutoff_date = now - timedelta(days=days)
+    filtered_events = {}
+    expired_ids = []
+    invalid_ids = []
+
+    # Timestamps written by save_sent_events share the cutoff's isoformat() layout;
+    # with the same length and UTC offset, string order is chronological order
+    cutoff_iso = cutoff_date.isoformat()
+    cutoff_len, cutoff_offset = len(cutoff_iso), cutoff_iso[-6:]
+
+    for event_id, timestamp_str in sent_events.items():
+        if (isinstance(timestamp_str, str) and len(timestamp_str) == cutoff_len
+                and timestamp_str.endswith(cutoff_offset) and timestamp_str[10:11] == 'T'):
+            is_recent = timestamp_str >= cutoff_iso
+        else:
+            try:
+                # Other layouts/offsets (e.g. across a DST change): parse the ISO format timestamp
+                is_recent = datetime.fromisoformat(timestamp_str) >= cutoff_date
+            except (ValueError, TypeError):
+                # If timestamp is invalid, remove it
+                invalid_ids.append(event_id)
+                continue
+
+        # Keep only events within the reminder frequency window
+        if is_recent:
+            filtered_events[event_id] = timestamp_str
+        else:
+            expired_ids.append(event_id)
+
+    # One summary line per kind instead of one log record per removed entry
+    if expired_ids and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Removing event IDs %s (older than %s days)", expired_ids, days)
+    if invalid_ids:
+        logger.warning("Invalid timestamps for event IDs %s. Removing from tracking.", invalid_ids)
+
+    return filtered_events
+
+
+def _read_sent_events(run_time: datetime) -> tuple:
+    """
+    Read the tracking file and drop events older than REMINDER_FREQUENCY_DAYS in memory.
+    Returns (sent_events, removed_count); nothing is written back here.
+    A missing or corrupted file gives an empty history.
     """
     if not SENT_EVENTS_FILE.exists():
         logger.info(f"Sent events file not found at {SENT_EVENTS_FILE}. Starting with empty history.")
-        return {}
+        return {}, 0
 
     try:
-        with open(SENT_EVENTS_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Raw bytes straight into the decoder (orjson parses UTF-8 bytes without a str copy)
+        data = _json_loads(SENT_EVENTS_FILE.read_bytes())
 
-            # Handle both old format (list) and new format (dict with timestamps)
-            sent_events_data = data.get('sent_events', {})
+        # Handle both old format (list) and new format (dict with timestamps)
+        sent_events_data = data.get('sent_events', {})
 
-            # Backward compatibility: if old format with sent_event_ids list
-            if not sent_events_data and 'sent_event_ids' in data:
-                logger.info("Converting old format to new format with timestamps")
-                # Convert old list format to new dict format with current time
-                current_time = datetime.now(tz=LOCAL_TZ).isoformat()
-                sent_events_data = {str(event_id): current_time for event_id in data['sent_event_ids']}
+        # Backward compatibility: if old format with sent_event_ids list
+        if not sent_events_data and 'sent_event_ids' in data:
+            logger.info("Converting old format to new format with timestamps")
+            # Convert old list format to new dict format with current time
+            current_time = run_time.isoformat()
+            sent_events_data = {str(event_id): current_time for event_id in data['sent_event_ids']}
 
-            # Convert string keys to integers
-            sent_events = {int(k): v for k, v in sent_events_data.items()}
+        # Convert string keys to integers
+        sent_events = {int(k): v for k, v in sent_events_data.items()}
 
-            logger.info(f"Loaded {len(sent_events)} event ID(s) from {SENT_EVENTS_FILE}")
+        logger.info(f"Loaded {len(sent_events)} event ID(s) from {SENT_EVENTS_FILE}")
 
-            # Filter out events older than REMINDER_FREQUENCY_DAYS
-            cutoff_date = datetime.now(tz=LOCAL_TZ) - timedelta(days=REMINDER_FREQUENCY_DAYS)
-            filtered_events = {}
-            removed_count = 0
+        # Filter out events older than REMINDER_FREQUENCY_DAYS
+        filtered_events = _prune_sent_events(sent_events, run_time, REMINDER_FREQUENCY_DAYS)
 
-            for event_id, timestamp_str in sent_events.items():
-                try:
-                    # Parse the ISO format timestamp
-                    event_timestamp = datetime.fromisoformat(timestamp_str)
-                    
-                    # Keep only events within the reminder frequency window
-                    if event_timestamp >= cutoff_date:
-                        filtered_events[event_id] = timestamp_str
-                    else:
-                        removed_count += 1
-                        logger.debug(f"Removing event ID {event_id} (sent at {timestamp_str}, older than {REMINDER_FREQUENCY_DAYS} days)")
-                
-                except (ValueError, TypeError) as e:
-                    # If timestamp is invalid, remove it
-                    logger.warning(f"Invalid timestamp for event ID {event_id}: {timestamp_str}. Removing from tracking.")
-                    removed_count += 1
-
-            if removed_count > 0:
-                logger.info(f"Removed {removed_count} event(s) older than {REMINDER_FREQUENCY_DAYS} days from tracking")
-                # Save the filtered events immediately to persist the cleanup
-                save_sent_events(filtered_events)
-            
-            logger.info(f"Tracking {len(filtered_events)} recent event ID(s) (sent within last {REMINDER_FREQUENCY_DAYS} days)")
-            return filtered_events
+        removed_count = len(sent_events) - len(filtered_events)
+        if removed_count > 0:
+            logger.info(f"Removed {removed_count} event(s) older than {REMINDER_FREQUENCY_DAYS} days from tracking")
+        
+        logger.info(f"Tracking {len(filtered_events)} recent event ID(s) (sent within last {REMINDER_FREQUENCY_DAYS} days)")
+        return filtered_events, removed_count
 
     except json.JSONDecodeError as e:
         logger.error(f"Corrupted JSON in {SENT_EVENTS_FILE}: {e}. Starting with empty history.")
-        return {}
+        return {}, 0
     except Exception as e:
         logger.error(f"Error loading sent events from {SENT_EVENTS_FILE}: {e}. Starting with empty history.")
-        return {}
+        return {}, 0
+
+
+def load_sent_events(persist_cleanup: bool = True, run_time: Optional[datetime] = None) -> dict:
+    """
+    Load the dictionary of event IDs that have already been sent with timestamps.
+    Automatically removes events older than REMINDER_FREQUENCY_DAYS.
+    Returns dict with event_id as key and sent_at timestamp as value.
+    Returns an empty dict if file doesn't exist or is corrupted.
+
+    Args:
+        persist_cleanup: Rewrite the file right away when old events were removed.
+            Pass False when the caller saves the returned dict later anyway,
+            so a run rewrites the history at most once.
+        run_time: The run's timestamp (defaults to now), used for the expiry cutoff
+            and as sent_at when converting the old list format.
+    """
+    if run_time is None:
+        run_time = datetime.now(tz=LOCAL_TZ)
+
+    sent_events, removed_count = _read_sent_events(run_time)
+    if removed_count > 0 and persist_cleanup:
+        # Save the filtered events immediately to persist the cleanup
+        save_sent_events(sent_events, run_time)
+    return sent_events
 
 
-def save_sent_events(sent_events: dict) -> None:
+def save_sent_events(sent_events: dict, run_time: Optional[datetime] = None) -> None:
     """
     Save the dictionary of sent event IDs with timestamps to JSON file.
     Includes metadata about last update.
@@ -226,37 +314,42 @@ def save_sent_events(sent_events: dict) -> None:
 
     Args:
         sent_events: Dict mapping event_id (int) -> sent_at timestamp (str)
+        run_time: Timestamp recorded as last_updated (defaults to now)
     """
+    if run_time is None:
+        run_time = datetime.now(tz=LOCAL_TZ)
+
     # CRITICAL FIX #3: Atomic file writes to prevent corruption
     try:
-        # Convert int keys to strings for JSON compatibility, sort by event ID
-        sent_events_sorted = {str(k): v for k, v in sorted(sent_events.items())}
+        # Sort by event ID; the encoders write the int keys as JSON strings themselves
+        sent_events_sorted = dict(sorted(sent_events.items()))
 
         data = {
             'sent_events': sent_events_sorted,
-            'last_updated': datetime.now(tz=LOCAL_TZ).isoformat()
+            'last_updated': run_time.isoformat()
         }
 
-        # Write to temporary file first
-        temp_fd, temp_path = tempfile.mkstemp(
-            dir=SENT_EVENTS_FILE.parent, 
+        # Write to temporary file first (same directory, so the rename below stays atomic)
+        temp_file = tempfile.NamedTemporaryFile(
+            mode='wb',
+            dir=SENT_EVENTS_FILE.parent,
             suffix='.tmp',
-            text=True
+            delete=False
         )
         
         try:
-            # Write JSON to temp file
-            with os.fdopen(temp_fd, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            # Write JSON to temp file (encoded in one go, written in one call)
+            with temp_file as f:
+                f.write(_json_dumps(data))
             
             # Atomically replace old file with new file
-            shutil.move(temp_path, SENT_EVENTS_FILE)
+            os.replace(temp_file.name, SENT_EVENTS_FILE)
             
             logger.info(f"Saved {len(sent_events)} event IDs with timestamps to {SENT_EVENTS_FILE}")
         except Exception:
             # Clean up temp file if something went wrong
-            if Path(temp_path).exists():
-                Path(temp_path).unlink()
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(temp_file.name)
             raise
             
     except Exception as e:
@@ -264,10 +357,15 @@ def save_sent_events(sent_events: dict) -> None:
         raise
 
 
-def filter_unsent_events(df: pd.DataFrame, sent_events: dict) -> pd.DataFrame:
+def filter_unsent_events(df: pd.DataFrame, sent_events: dict, sent_ids: Optional[FrozenSet[int]] = None) -> pd.DataFrame:
     """
     Filter DataFrame to only include events that haven't been sent yet.
     Returns a new DataFrame with only unsent events.
+
+    Args:
+        df: Events DataFrame
+        sent_events: Dict mapping event_id (int) -> sent_at timestamp (str)
+        sent_ids: Optional precomputed frozenset(sent_events), built once per run
     """
     if df.empty:
         return df
@@ -276,8 +374,19 @@ def filter_unsent_events(df: pd.DataFrame, sent_events: dict) -> pd.DataFrame:
         logger.warning("DataFrame missing 'id' column. Cannot filter sent events. Returning all events.")
         return df
     
-    # Filter out events that have already been sent (use keys from dict)
-    unsent_df = df[~df['id'].isin(sent_events.keys())].copy()
+    # Filter out events that have already been sent: one vectorized int64 membership test
+    if sent_ids is None:
+        sent_ids = frozenset(sent_events)
+    if not sent_ids:
+        return df
+    sent_array = np.fromiter(sent_ids, dtype=np.int64, count=len(sent_ids))
+    already_sent = np.isin(df['id'].to_numpy(), sent_array)
+
+    if not already_sent.any():
+        return df
+
+    # Copy: main() reformats columns of the filtered frame in place
+    unsent_df = df[~already_sent].copy()
     
     filtered_count = len(df) - len(unsent_df)
     if filtered_count > 0:
@@ -289,6 +398,36 @@ def filter_unsent_events(df: pd.DataFrame, sent_events: dict) -> pd.DataFrame:
 # ---------------------------------------
 # Image Handling
 # ---------------------------------------
+# MIME type by logo file extension
+LOGO_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml'
+}
+
+
+@lru_cache(maxsize=8)
+def _read_logo(path_str: str, mtime_ns: int, size: int) -> tuple:
+    """
+    Read a logo once per (path, mtime, size): every later email reuses the bytes,
+    and a replaced file (new mtime or size) is picked up without a restart.
+    A read shorter or longer than the stat'd size (file caught mid-write) raises,
+    so it is never cached. Works on the plain path string (no Path objects on this path).
+    """
+    # Unbuffered: one whole-file read needs no BufferedReader or its 8 KiB buffer
+    with open(path_str, 'rb', buffering=0) as f:
+        logo_data = f.read()
+    if len(logo_data) != size:
+        raise OSError(f"read {len(logo_data)} of {size} bytes, file changed while reading")
+
+    # Determine MIME type from extension
+    mime_type = LOGO_MIME_TYPES.get(os.path.splitext(path_str)[1].lower(), 'image/png')
+
+    return logo_data, mime_type, os.path.basename(path_str)
+
+
 def load_logo(logo_path):
     """
     Load logo file for email attachment.
@@ -297,43 +436,47 @@ def load_logo(logo_path):
     Args:
         logo_path: Path object pointing to the logo file
     """
-    if not logo_path.exists():
-        logger.warning(f"Logo not found at: {logo_path}")
+    path_str = os.fspath(logo_path)
+    try:
+        stat = os.stat(path_str)
+    except OSError:
+        logger.warning(f"Logo not found at: {path_str}")
         return None, None, None
 
     try:
-        with open(logo_path, 'rb') as f:
-            logo_data = f.read()
-
-        # Determine MIME type from extension
-        ext = logo_path.suffix.lower()
-        mime_types = {
-            '.png': 'image/png',
-            '.jpg': 'image/jpeg',
-            '.jpeg': 'image/jpeg',
-            '.gif': 'image/gif',
-            '.svg': 'image/svg+xml'
-        }
-        mime_type = mime_types.get(ext, 'image/png')
-
-        return logo_data, mime_type, logo_path.name
-
+        return _read_logo(path_str, stat.st_mtime_ns, stat.st_size)
     except Exception as e:
-        logger.error(f"Failed to load logo from {logo_path}: {e}")
+        logger.error(f"Failed to load logo from {path_str}: {e}")
         return None, None, None
 
 
+@lru_cache(maxsize=8)
+def _logo_mime_part(logo_data: bytes, mime_type: str, filename: str, content_id: str):
+    """Build the inline MIMEImage for a logo once; send_email attaches copies of it"""
+    from email.mime.image import MIMEImage
+
+    img = MIMEImage(logo_data, _subtype=mime_type.partition('/')[2])
+    img.add_header('Content-ID', f'<{content_id}>')
+    img.add_header('Content-Disposition', 'inline', filename=filename)
+    return img
+
+
 # ------------------------------------------
 # DataFrame Column Validation 
 # (prevents runtime crashes)
 # ------------------------------------------
-def validate_dataframe_columns(df: pd.DataFrame, required_columns: List[str], context: str = "DataFrame") -> None:
+# Columns each query result must provide (built once, reused every run)
+REQUIRED_EVENT_COLUMNS = frozenset({'id', 'event_name', 'created_at', 'email'})
+REQUIRED_TYPE_STATUS_COLUMNS = frozenset({'type_name', 'status_name'})
+
+
+def validate_dataframe_columns(df: pd.DataFrame, required_columns: Iterable[str], context: str = "DataFrame") -> None:
     """
     Validate that DataFrame contains all required columns.
 
     Args:
         df: DataFrame to validate
-        required_columns: List of column names that must be present
+        required_columns: Column names that must be present (a frozenset is used as-is)
         context: Description of where/why validation is happening (for error messages)
 
     Raises:
@@ -343,28 +486,49 @@ def validate_dataframe_columns(df: pd.DataFrame, required_columns: List[str], co
         logger.debug(f"{context} is empty - skipping column validation")
         return
 
-    missing_columns = set(required_columns) - set(df.columns)
+    validate_columns(df.columns, required_columns, context)
 
-    if missing_columns:
-        available = ", ".join(df.columns)
-        missing = ", ".join(sorted(missing_columns))
-        error_msg = (
-            f"{context} missing required columns: {missing}. "
-            f"Available columns: {available}. "
-            f"Check SQL query returns all expected columns."
-        )
-        logger.error(error_msg)
-        raise ValueError(error_msg)
 
-    logger.debug(f"{context} validation passed - all {len(required_columns)} required columns present")
+def validate_columns(columns: Iterable[str], required_columns: Iterable[str], context: str = "Query result") -> None:
+    """
+    Validate that a result's column names (DataFrame columns or Result.keys()) include all required columns.
+
+    Raises:
+        ValueError: If any required columns are missing
+    """
+    required = required_columns if isinstance(required_columns, frozenset) else frozenset(required_columns)
+    if required.issubset(columns):
+        logger.debug("%s validation passed - all %d required columns present", context, len(required))
+        return
+
+    missing_columns = required.difference(columns)
+
+    available = ", ".join(columns)
+    missing = ", ".join(sorted(missing_columns))
+    error_msg = (
+        f"{context} missing required columns: {missing}. "
+        f"Available columns: {available}. "
+        f"Check SQL query returns all expected columns."
+    )
+    logger.error(error_msg)
+    raise ValueError(error_msg)
 
 
 # ---------------------------------------
 # SQL Query Loader
 # ---------------------------------------
+@lru_cache(maxsize=4)
+def _resolve_dir(directory: Path) -> Path:
+    """realpath() a base directory once, keyed on the path so a patched QUERIES_DIR still resolves"""
+    return directory.resolve()
+
+
+@lru_cache(maxsize=None)
 def load_sql_query(query_file='VesselAttendances.sql') -> str:
     """
     Load SQL query from queries directory with path traversal protection.
+    Results are memoized per file name (query files only change on deploy);
+    queries/ holds a handful of files, so the cache is unbounded (no LRU bookkeeping).
 
     Args:
         query_file: Name of the SQL file in queries directory
@@ -382,7 +546,7 @@ def load_sql_query(query_file='VesselAttendances.sql') -> str:
     # This prevents queries like "../../../etc/passwd" from accessing files outside queries/
     try:
         resolved_query = query_path.resolve()
-        resolved_queries_dir = QUERIES_DIR.resolve()
+        resolved_queries_dir = _resolve_dir(QUERIES_DIR)
 
         if not resolved_query.is_relative_to(resolved_queries_dir):
             raise ValueError(
@@ -418,10 +582,132 @@ def load_sql_query(query_file='VesselAttendances.sql') -> str:
         raise
 
 
+def preload_sql_queries() -> int:
+    """
+    Warm the load_sql_query cache with every .sql file in QUERIES_DIR (one directory scan),
+    so no scheduled run touches the disk for its queries. Returns the number of files loaded.
+    A file that fails validation is logged by load_sql_query and skipped here; a missing
+    or unreadable QUERIES_DIR is logged and the queries are loaded lazily by each run.
+    """
+    loaded = 0
+    try:
+        entries = os.scandir(QUERIES_DIR)
+    except OSError as e:
+        logger.error(f"Could not preload queries from {QUERIES_DIR}: {e}")
+        return 0
+
+    with entries:
+        for entry in entries:
+            if entry.name.endswith('.sql') and entry.is_file():
+                try:
+                    load_sql_query(entry.name)
+                    loaded += 1
+                except (ValueError, OSError):
+                    pass
+    return loaded
+
+
+# ---------------------------------------
+# Events Query
+# ---------------------------------------
+def fetch_events(conn, query_sql: str, params: dict) -> pd.DataFrame:
+    """
+    Run the events query and return its rows as a DataFrame.
+    main() reads events only through here, so tests can replace the DB read in one place.
+
+    Args:
+        conn: Open database connection (the connectorx reader only takes its string quoting)
+        query_sql: Events SQL with named parameters
+        params: Values bound to the named parameters
+
+    Returns:
+        DataFrame of events (REQUIRED_EVENT_COLUMNS only when no rows match)
+    """
+    if HAS_CONNECTORX:
+        # Native reader: result decoded straight into Arrow buffers. It takes no bind parameters,
+        # so they are inlined as literals quoted the way conn's server reads them
+        backslash_escapes = getattr(conn.dialect, '_backslash_escapes', False)
+        return query_to_df(render_params(query_sql, params, backslash_escapes))
+
+    # Server-side cursor + chunks: peak memory follows the chunk size, not the result size.
+    # Set on the statement: Connection.execution_options() would switch the caller's conn for good
+    query = text(query_sql).execution_options(stream_results=True)
+    chunks = list(pd.read_sql_query(
+        query,
+        conn,
+        params=params,
+        chunksize=EVENTS_QUERY_CHUNKSIZE,
+        dtype_backend='pyarrow'
+    ))
+    if not chunks:
+        return pd.DataFrame(columns=sorted(REQUIRED_EVENT_COLUMNS))
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks, ignore_index=True)
+
+
 # ---------------------------------------
 # Teams Message Function
 # ---------------------------------------
 # HAVE NOT UPDATED SINCE HOT WORKS SPECS
+# Created on first Teams post
+_TEAMS_SESSION: Optional[requests.Session] = None
+
+
+def _teams_session() -> requests.Session:
+    """
+    Process-wide HTTP session for the Teams webhook: the pooled keep-alive
+    connection reuses its TLS session across posts instead of a handshake per send.
+    """
+    global _TEAMS_SESSION
+    if _TEAMS_SESSION is None:
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        _TEAMS_SESSION = session
+    return _TEAMS_SESSION
+
+
+def make_teams_card(df, run_time) -> dict:
+    """Build the MessageCard payload (same schema pymsteams' connectorcard produces)"""
+    # Set title based on results
+    if df.empty:
+        return {
+            'title': "AlertDev | No Events Found",
+            'themeColor': "FFC107",  # Yellow/warning color
+            'text': "No events matching criteria were found in the last {} days.".format(EVENT_LOOKBACK_DAYS),
+            'sections': [{'text': f"*Automated report from {COMPANY_NAME}*"}],
+        }
+
+    # Summary section
+    summary_section = {
+        'activityTitle': "Report Summary",
+        'activitySubtitle': run_time.strftime('%A, %B %d, %Y at %H:%M %Z'),
+        'facts': [
+            {'name': "Type", 'value': "Vessel Attendances"},
+            {'name': "Period", 'value': f"Last {EVENT_LOOKBACK_DAYS} days"},
+            {'name': "Frequency", 'value': f"{duration(SCHEDULE_FREQUENCY)}"},
+            {'name': "Results", 'value': f"**{len(df)}** event{'s' if len(df) != 1 else ''}"},
+        ],
+    }
+
+    # Events section (limit to first 10 to avoid message size limits)
+    event_text = ""
+    for idx, row in df.head(10).iterrows():
+        event_text += f"**{idx + 1}. {row['event_name']}**  \n"
+        event_text += f"Created: {row['created_at']}  \n\n"
+
+    if len(df) > 10:
+        event_text += f"_...and {len(df) - 10} more event(s)_"
+
+    events_section = {'activityTitle': "Event Details", 'text': event_text}
+
+    return {
+        'title': f"AlertDev | {len(df)} Permit Event{'s' if len(df) != 1 else ''} Found",
+        'themeColor': "2EA9DE",  # Light blue brand color
+        'sections': [summary_section, events_section, {'text': f"*Automated report from {COMPANY_NAME}*"}],
+    }
+
+
 def send_teams_message(df, run_time):
     """Send formatted message to Microsoft Teams channel"""
     if not TEAMS_WEBHOOK_URL:
@@ -429,60 +715,17 @@ def send_teams_message(df, run_time):
         return
 
     try:
-        # Create Teams message card
-        teams_message = pymsteams.connectorcard(TEAMS_WEBHOOK_URL)
+        card = make_teams_card(df, run_time)
 
-        # Set title based on results
-        if df.empty:
-            teams_message.title(f"AlertDev | No Events Found")
-            teams_message.color("FFC107")  # Yellow/warning color
-            teams_message.text("No events matching criteria were found in the last {} days.".format(EVENT_LOOKBACK_DAYS))
-        else:
-            teams_message.title(f"AlertDev | {len(df)} Permit Event{'s' if len(df) != 1 else ''} Found")
-            teams_message.color("2EA9DE")  # Light blue brand color
-
-            # Create summary section
-            summary_section = pymsteams.cardsection()
-            summary_section.activityTitle("Report Summary")
-            summary_section.activitySubtitle(run_time.strftime('%A, %B %d, %Y at %H:%M %Z'))
-            summary_section.addFact("Type", "Vessel Attendances")
-            summary_section.addFact("Period", f"Last {EVENT_LOOKBACK_DAYS} days")
-            summary_section.addFact("Frequency", f"{duration(SCHEDULE_FREQUENCY)}")
-            summary_section.addFact("Results", f"**{len(df)}** event{'s' if len(df) != 1 else ''}")
-            teams_message.addSection(summary_section)
-
-            # Create events section
-            events_section = pymsteams.cardsection()
-            events_section.activityTitle("Event Details")
-
-            # Add events (limit to first 10 to avoid message size limits)
-            event_text = ""
-            for idx, row in df.head(10).iterrows():
-                event_text += f"**{idx + 1}. {row['event_name']}**  \n"
-                event_text += f"Created: {row['created_at']}  \n\n"
-
-            if len(df) > 10:
-                event_text += f"_...and {len(df) - 10} more event(s)_"
-
-            events_section.text(event_text)
-            teams_message.addSection(events_section)
-
-        # Add footer
-        footer_section = pymsteams.cardsection()
-        footer_section.text(f"*Automated report from {COMPANY_NAME}*")
-        teams_message.addSection(footer_section)
-
-        # Send the message and capture response
+        # Send the message over the pooled session and check the response
         logger.info("Sending message to Teams webhook...")
-        response = teams_message.send()
-
-        # Log response details
-        logger.info(f"Teams API response: {response}")
+        response = _teams_session().post(TEAMS_WEBHOOK_URL, json=card, timeout=TEAMS_HTTP_TIMEOUT)
+        response.raise_for_status()
+        # Legacy connectors answer HTTP 200 with an error text instead of '1' (as pymsteams checked)
+        if response.status_code == requests.codes.ok and response.text != '1':
+            raise requests.HTTPError(f"Teams webhook did not accept the message: {response.text}", response=response)
 
-        if response:
-            logger.info(f"[OK] Teams message sent successfully to webhook (HTTP {response}, status code {teams_message.last_http_response.status_code})")
-        else:
-            logger.warning(f"[!!!] Teams returned success but no response code - message may not have been delivered")
+        logger.info(f"[OK] Teams message sent successfully to webhook (status code {response.status_code})")
 
     except Exception as e:
         logger.exception(f"[EXC] Failed to send Teams message: {e}")
@@ -492,10 +735,12 @@ def send_teams_message(df, run_time):
 # ---------------------------------------
 # Email Template Functions
 # ---------------------------------------
+@lru_cache(maxsize=32)
 def get_event_id_name(type_id: int, filename='get_events_name.sql') -> tuple:
     """
     Fetch event type name from event_types table for a given type_id.
     Returns tuple of (event_id, event_name)
+    Memoized: the name is fixed per process, so the DB is queried once per type_id.
     """
     query_sql = load_sql_query(filename)
     query = text(query_sql)
@@ -507,12 +752,38 @@ def get_event_id_name(type_id: int, filename='get_events_name.sql') -> tuple:
         return '', 'Unknown Event'
 
 
+# Bound at import: the real caches are still cleared while a test has patched one of these names
+_MEMOIZED = (load_sql_query, get_event_id_name, _read_logo, _logo_mime_part)
+
+
+def invalidate_caches() -> None:
+    """Clear memoized query files, event type names and logos (used by the tests)"""
+    for memoized in _MEMOIZED:
+        memoized.cache_clear()
+
+
 def make_subject(event_count, type_id: int = EVENT_TYPE_ID):
     """Generate email subject line"""
     event_id, event_name = get_event_id_name(type_id)
     return f"AlertDev | {event_count} {event_name.title()} Event{'s' if event_count != 1 else ''} Found"
 
 
+def with_display_nulls(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give Arrow-backed columns that hold NULLs the values the NumPy-backed read_sql_query
+    frames had, so the emails and Teams card show a NULL as before instead of <NA>:
+    None in text (object) columns, nan in numeric ones (which read_sql_query made float).
+    """
+    converted = {}
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.ArrowDtype) and df[col].hasnans:
+            if dtype.kind in 'iuf':
+                converted[col] = df[col].to_numpy(dtype='float64', na_value=np.nan)
+            else:
+                converted[col] = df[col].to_numpy(dtype=object, na_value=None)
+    return df.assign(**converted) if converted else df
+
+
 def make_plain_text(df, run_time):
     """Generate plain text email dynamically based on available columns"""
     header = f"""AlertDev | {run_time.strftime('%Y-%m-%d %H:%M %Z')}
@@ -523,66 +794,44 @@ def make_plain_text(df, run_time):
     if df.empty:
         return header + f"\nNo results found.\n\n---\nAutomated report from {COMPANY_NAME}."
 
-    text = header + "\nEvents:\n"
+    parts = [header, "\nEvents:\n"]
 
-    for idx, row in df.iterrows():
-        text += f"\n{idx + 1}."
-        # Add link if ID is available (using configurable base URL)
-        if 'id' in df.columns:
-            event_url = f"{EVENTS_BASE_URL}/{row['id']}"
-            text += f"\n   Link: {event_url}"
-        for col in df.columns:
-            text += f"\n   {col}: {row[col]}"
-        text += "\n"
+    # Link if ID is available (using configurable base URL)
+    columns = list(df.columns)
+    id_pos = columns.index('id') + 1 if 'id' in columns else None
+    for row in df.itertuples(index=True, name=None):
+        idx, values = row[0], row[1:]
+        link = f"\n   Link: {EVENTS_BASE_URL}/{row[id_pos]}" if id_pos else ""
+        fields = ''.join(f"\n   {col}: {value}" for col, value in zip(columns, values))
+        parts.append(f"\n{idx + 1}.{link}{fields}\n")
 
-    text += f"\n---\nThis is an automated message from {COMPANY_NAME}.\nIf you have questions about this report, please contact data@prominencemaritime.com."
-    return text
+    parts.append(f"\n---\nThis is an automated message from {COMPANY_NAME}.\nIf you have questions about this report, please contact data@prominencemaritime.com.")
+    return ''.join(parts)
 
 
-def make_html(df, run_time, df_type_and_status=pd.DataFrame(), has_company_logo=False, has_st_logo=False):
-    """Generate a rich, dynamically formatted HTML email for events."""
-    event_id, event_name = get_event_id_name(type_id=EVENT_TYPE_ID)
-
-    if df_type_and_status.empty:
-        type_name = 'Default Type'
-        status_name = 'Default Status'
-    else:
-        # Get 'type name' and 'status name'
-        logger.info("Trying to extract type name and status name from 'df_type_and_status'")
-        type_name = str(df_type_and_status.at[0, 'type_name'])
-        status_name = str(df_type_and_status.at[0, 'status_name'])
-        logger.info(f"Found: 'Event Type' = {type_name}, 'Status Name' = {status_name}")
-
-    
-    # Initialize event_ids to avoid NameError when df is empty
-    event_ids = []
+def _event_link_cell(event_id, event_name) -> str:
+    """Table cell with event_name as a clickable link (using configurable base URL)"""
+    return f"""<td>
+                        <strong>
+                            <a href="{EVENTS_BASE_URL}/{event_id}" 
+                               style="color: #2EA9DE; text-decoration: none;"
+                               target="_blank">
+                                {event_name}
+                            </a>
+                        </strong>
+                    </td>"""
 
-    logos_html = ""
-    if has_company_logo:
-        logos_html += f"""
-        <img src="cid:company_logo" alt="{COMPANY_NAME} logo"
-             style="max-height:50px; margin-right:15px; vertical-align:middle;">
-        """
-    if has_st_logo:
-        logos_html += f"""
-        <img src="cid:st_company_logo" alt="ST logo"
-             style="max-height:45px; vertical-align:middle;">
-        """
 
-    html = f"""<!DOCTYPE html>
-<html lang="en">
-<head>
-<meta charset="UTF-8">
-<style>
-    body {{
+# Static parts of the HTML email, built once at import: make_html only renders the body
+_HTML_CSS = """    body {
         font-family: -apple-system, BlinkMacSystemFont, "Segoe UI", Roboto, Arial, sans-serif;
         background-color: #f9fafc;
         color: #333;
         line-height: 1.6;
         margin: 0;
         padding: 0;
-    }}
-    .container {{
+    }
+    .container {
         max-width: 900px;
         margin: 30px auto;
         background: #ffffff;
@@ -590,8 +839,8 @@ def make_html(df, run_time, df_type_and_status=pd.DataFrame(), has_company_logo=
         box-shadow: 0 2px 8px rgba(0,0,0,0.05);
         overflow: hidden;
         padding: 20px 40px;
-    }}
-    .header {{
+    }
+    .header {
         background-color: #0B4877;
         color: white;
         padding: 15px 25px;
@@ -599,25 +848,25 @@ def make_html(df, run_time, df_type_and_status=pd.DataFrame(), has_company_logo=
         display: flex;
         align-items: center;
         justify-content: space-between;
-    }}
-    .header h1 {{
+    }
+    .header h1 {
         margin: 0;
         font-size: 22px;
         font-weight: 600;
-    }}
-    .header p {{
+    }
+    .header p {
         margin: 0;
         font-size: 14px;
         color: #d7e7f5;
-    }}
-    .metadata {{
+    }
+    .metadata {
         background-color: #f5f5f5;
         padding: 12px;
         border-radius: 5px;
         margin: 20px 0;
         font-size: 14px;
-    }}
-    .count-badge {{
+    }
+    .count-badge {
         display: inline-block;
         background-color: #2EA9DE;
         color: white;
@@ -625,49 +874,115 @@ def make_html(df, run_time, df_type_and_status=pd.DataFrame(), has_company_logo=
         border-radius: 12px;
         font-size: 14px;
         font-weight: 600;
-    }}
-    table {{
+    }
+    table {
         width: 100%;
         border-collapse: collapse;
         margin: 20px 0;
         font-size: 14px;
-    }}
-    th {{
+    }
+    th {
         background-color: #0B4877;
         color: white;
         text-align: left;
         padding: 10px;
-    }}
-    td {{
+    }
+    td {
         padding: 8px 10px;
         border-bottom: 1px solid #e0e6ed;
-    }}
-    tr:nth-child(even) {{
+    }
+    tr:nth-child(even) {
         background-color: #f5f8fb;
-    }}
-    tr:hover {{
+    }
+    tr:hover {
         background-color: #eef5fc;
-    }}
-    a {{
+    }
+    a {
         color: #2EA9DE;
         text-decoration: none;
-    }}
-    a:hover {{
+    }
+    a:hover {
         text-decoration: underline;
-    }}
-    .footer {{
+    }
+    .footer {
         font-size: 12px;
         color: #888;
         text-align: center;
         padding: 10px;
         border-top: 1px solid #eee;
         margin-top: 20px;
-    }}
-</style>
+    }
+"""
+
+_HTML_SHELL = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<style>
+{css}</style>
 </head>
 <body>
 <div class="container">
-    <div class="header">
+{body}</div>
+</body>
+</html>
+"""
+
+# The shell "compiled" once: stylesheet inlined and split around the body,
+# so each email is two concatenations instead of a str.format parse
+_HTML_PREFIX, _, _HTML_SUFFIX = _HTML_SHELL.replace('{css}', _HTML_CSS).partition('{body}')
+
+
+def render_row(rec: dict, has_link: bool) -> str:
+    """One <tr> of the events table, from a df.to_dict(orient='records') entry"""
+    return "<tr>" + ''.join(
+        _event_link_cell(rec['id'], value) if has_link and col == 'event_name' else f"<td>{value}</td>"
+        for col, value in rec.items()
+    ) + "</tr>"
+
+
+def render_rows(df) -> List[str]:
+    """
+    HTML table rows for df, in row order. Rows only depend on the row itself,
+    so main() renders the full frame once and reuses the fragments for every
+    recipient group and for the trimmed (logo-less) variants.
+    """
+    # One dict per row (no per-row Series)
+    has_link = 'event_name' in df.columns and 'id' in df.columns
+    return [render_row(rec, has_link) for rec in df.to_dict(orient='records')]
+
+
+def type_status_names(df_type_and_status: Optional[pd.DataFrame]) -> tuple:
+    """(type_name, status_name) for the report metadata, with defaults when the lookup found nothing"""
+    if df_type_and_status is None or df_type_and_status.empty:
+        return 'Default Type', 'Default Status'
+    # Get 'type name' and 'status name'
+    logger.info("Trying to extract type name and status name from 'df_type_and_status'")
+    type_name = str(df_type_and_status.at[0, 'type_name'])
+    status_name = str(df_type_and_status.at[0, 'status_name'])
+    logger.info(f"Found: 'Event Type' = {type_name}, 'Status Name' = {status_name}")
+    return type_name, status_name
+
+
+def wrap_html(fragments: List[str], columns, run_time, type_status: tuple = ('Default Type', 'Default Status'),
+              has_company_logo=False, has_st_logo=False) -> str:
+    """Wrap pre-rendered table rows (see render_rows) in the header, metadata and footer of the HTML email."""
+    event_id, event_name = get_event_id_name(EVENT_TYPE_ID)
+    type_name, status_name = type_status
+
+    logos_html = ""
+    if has_company_logo:
+        logos_html += f"""
+        <img src="cid:company_logo" alt="{COMPANY_NAME} logo"
+             style="max-height:50px; margin-right:15px; vertical-align:middle;">
+        """
+    if has_st_logo:
+        logos_html += f"""
+        <img src="cid:st_company_logo" alt="ST logo"
+             style="max-height:45px; vertical-align:middle;">
+        """
+
+    html = f"""    <div class="header">
         <div>{logos_html}</div>
         <div style="text-align:right;">
             <h1>{event_name} Alerts</h1>
@@ -677,7 +992,7 @@ def make_html(df, run_time, df_type_and_status=pd.DataFrame(), has_company_logo=
 """
 
     # Table or "no results" message
-    if df.empty:
+    if not fragments:
         html += """
         <p style="margin-top:25px; font-size:15px;">
             <strong>No events found for the current query.</strong>
@@ -689,54 +1004,101 @@ def make_html(df, run_time, df_type_and_status=pd.DataFrame(), has_company_logo=
             <strong>Report Generated:</strong> {run_time.strftime('%A, %B %d, %Y at %H:%M %Z')}<br>
             <strong>Query Criteria:</strong> Type: {type_name}, Status: {status_name}, Lookback: {EVENT_LOOKBACK_DAYS} day{'' if EVENT_LOOKBACK_DAYS == 1 else 's'}<br>
             <strong>Frequency:</strong> {duration(SCHEDULE_FREQUENCY)}<br>
-            <strong>Results Found:</strong> <span class="count-badge">{len(df)}</span>
+            <strong>Results Found:</strong> <span class="count-badge">{len(fragments)}</span>
         </div>
         <table>
             <thead><tr>"""
         
-        for col in df.columns:
-            html += f"<th>{col.replace('_', ' ').title()}</th>"
+        html += ''.join(f"<th>{col.replace('_', ' ').title()}</th>" for col in columns)
         
         html += "</tr></thead><tbody>"
-
-        for idx, row in df.iterrows():
-            html += "<tr>"
-            for col in df.columns:
-                if col == 'event_name' and 'id' in df.columns:
-                    # Make event_name a clickable link (using configurable base URL)
-                    event_url = f"{EVENTS_BASE_URL}/{row['id']}"
-                    html += f"""<td>
-                        <strong>
-                            <a href="{event_url}" 
-                               style="color: #2EA9DE; text-decoration: none;"
-                               target="_blank">
-                                {row[col]}
-                            </a>
-                        </strong>
-                    </td>"""
-                    event_ids.append(row['id'])
-                else:
-                    html += f"<td>{row[col]}</td>"
-            html += "</tr>"
-
+        html += ''.join(fragments)
         html += "</tbody></table>"
 
     html += f"""
     <div class="footer">
         This is an automated report generated by {COMPANY_NAME}.
     </div>
-</div>
-</body>
-</html>
 """
+    return _HTML_PREFIX + html + _HTML_SUFFIX
+
+
+def make_html(df, run_time, df_type_and_status: Optional[pd.DataFrame] = None, has_company_logo=False, has_st_logo=False):
+    """Generate a rich, dynamically formatted HTML email for events."""
+    # event_ids stays empty when df is empty or there is nothing to link
+    event_ids = []
+    if not df.empty and 'event_name' in df.columns and 'id' in df.columns:
+        event_ids = df['id'].tolist()
+
+    html = wrap_html(render_rows(df), df.columns, run_time, type_status_names(df_type_and_status),
+                     has_company_logo=has_company_logo, has_st_logo=has_st_logo)
     return event_ids, html
 
 
 # ---------------------------------------
 # Email Sending Function
 # ---------------------------------------
-def send_email(subject: str, plain_text: str, html_content: str, recipients: List[str]) -> None:
-    """Send email with both plain text and HTML versions, and embedded logo"""
+class SmtpSession:
+    """
+    One logged-in SMTP connection reused for every email of a run, so the TLS
+    handshake and AUTH are paid once per cycle instead of once per recipient group.
+    The connection is opened on first send (nothing is dialled when email is
+    disabled), reopened once if the server dropped it, and quit on exit.
+    A lock serializes sends so the session can be shared between threads.
+    """
+
+    def __init__(self):
+        self._smtp = None
+        self._lock = threading.Lock()
+
+    def _open(self) -> smtplib.SMTP:
+        if SMTP_PORT == 465:
+            # SSL connection
+            smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=30)
+        else:
+            # STARTTLS connection (ports 587/25)
+            smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30)
+            smtp.ehlo()
+            smtp.starttls()
+            smtp.ehlo()
+        smtp.login(SMTP_USER, SMTP_PASS)
+        return smtp
+
+    def _close(self) -> None:
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        finally:
+            self._smtp = None
+
+    def send_message(self, msg) -> None:
+        with self._lock:
+            if self._smtp is None:
+                self._smtp = self._open()
+            try:
+                self._smtp.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                logger.warning("SMTP connection dropped, reconnecting")
+                self._smtp = self._open()
+                self._smtp.send_message(msg)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        with self._lock:
+            self._close()
+        return False
+
+
+def send_email(subject: str, plain_text: str, html_content: str, recipients: List[str], smtp: Optional[SmtpSession] = None) -> None:
+    """
+    Send email with both plain text and HTML versions, and embedded logo.
+    Pass an open SmtpSession to reuse its connection across several emails.
+    """
     if not recipients:
         logger.warning("No recipients configured. Skipping email send.")
         return
@@ -744,7 +1106,6 @@ def send_email(subject: str, plain_text: str, html_content: str, recipients: Lis
     # Create multipart message
     from email.mime.multipart import MIMEMultipart
     from email.mime.text import MIMEText
-    from email.mime.image import MIMEImage
 
     msg = MIMEMultipart('related')
     msg['Subject'] = subject
@@ -763,39 +1124,19 @@ def send_email(subject: str, plain_text: str, html_content: str, recipients: Lis
     part_html = MIMEText(html_content, 'html', 'utf-8')
     msg_alternative.attach(part_html)
 
-    # Attach company logo as embedded image with CID
-    company_logo_data, company_mime_type, company_filename = load_logo(COMPANY_LOGO)
-    if company_logo_data:
-        maintype, subtype = company_mime_type.split('/')
-        img = MIMEImage(company_logo_data, _subtype=subtype)
-        img.add_header('Content-ID', '<company_logo>')
-        img.add_header('Content-Disposition', 'inline', filename=company_filename)
-        msg.attach(img)
-
-    # Attach ST company logo as embedded image with CID
-    st_logo_data, st_mime_type, st_filename = load_logo(ST_COMPANY_LOGO)
-    if st_logo_data:
-        maintype, subtype = st_mime_type.split('/')
-        img = MIMEImage(st_logo_data, _subtype=subtype)
-        img.add_header('Content-ID', '<st_company_logo>')
-        img.add_header('Content-Disposition', 'inline', filename=st_filename)
-        msg.attach(img)
-
-    # Connect and send
+    # Attach company and ST company logos as embedded images with CID
+    for logo_path, content_id in ((COMPANY_LOGO, 'company_logo'), (ST_COMPANY_LOGO, 'st_company_logo')):
+        logo_data, mime_type, filename = load_logo(logo_path)
+        if logo_data:
+            msg.attach(copy.copy(_logo_mime_part(logo_data, mime_type, filename, content_id)))
+
+    # Send over the caller's session, or a one-off session for a single email
     try:
-        if SMTP_PORT == 465:
-            # SSL connection
-            with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
-                smtp.login(SMTP_USER, SMTP_PASS)
-                smtp.send_message(msg)
+        if smtp is not None:
+            smtp.send_message(msg)
         else:
-            # STARTTLS connection (ports 587/25)
-            with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=30) as smtp:
-                smtp.ehlo()
-                smtp.starttls()
-                smtp.ehlo()
-                smtp.login(SMTP_USER, SMTP_PASS)
-                smtp.send_message(msg)
+            with SmtpSession() as session:
+                session.send_message(msg)
 
         logger.info(f"[OK] Email sent successfully to {len(recipients)} recipient{'' if len(recipients) == 1 else 's'}: {', '.join(recipients)}")
     except Exception as e:
@@ -813,10 +1154,19 @@ def main():
     
     run_time = datetime.now(tz=LOCAL_TZ)
     logger.info(f"Current time (Europe/Athens): {run_time.isoformat()}")
+
+    # With every channel off (e.g. --dry-run) nothing is rendered or sent
+    alerts_enabled = ENABLE_EMAIL_ALERTS or ENABLE_SPECIAL_TEAMS_EMAIL_ALERT or ENABLE_TEAMS_ALERTS
     
+    # Set while expired entries are pruned in memory only; the run's save clears it
+    cleanup_pending = False
+
     try:
         # Load previously sent event IDs with timestamps
-        sent_events = load_sent_events()
+        # Expired entries are dropped in memory and persisted with this run's save
+        sent_events, removed_count = _read_sent_events(run_time)
+        cleanup_pending = removed_count > 0
+        sent_ids = frozenset(sent_events)
         
         # Connect to database
         logger.info("--> ESTABLISHING DATABASE CONNECTION:")
@@ -825,222 +1175,266 @@ def main():
             
             # Load query from file
             query_sql = load_sql_query(config('SQL_QUERY_FILE'))
-            query = text(query_sql) 
 
             # Execute Admin Query
             logger.info(f"--> CONSTRUCTING DATAFRAME:")
             logger.info(f"Query parameters: id={EVENT_TYPE_ID}, status={EVENT_STATUS_ID}, include='%{EVENT_NAME_FILTER}%', exclude='%{EVENT_EXCLUDE}%', lookback={EVENT_LOOKBACK_DAYS}")
             
-            df = pd.read_sql_query(
-                query, 
-                conn, 
-                params={
-                    'type_id': EVENT_TYPE_ID,
-                    'status_id': EVENT_STATUS_ID,
-                    'name_filter': f'%{EVENT_NAME_FILTER}%',
-                    'name_excluded': f'%{EVENT_EXCLUDE}%',
-                    'lookback_days': EVENT_LOOKBACK_DAYS
-                }
-            )
+            event_params = {
+                'type_id': EVENT_TYPE_ID,
+                'status_id': EVENT_STATUS_ID,
+                'name_filter': f'%{EVENT_NAME_FILTER}%',
+                'name_excluded': f'%{EVENT_EXCLUDE}%',
+                'lookback_days': EVENT_LOOKBACK_DAYS
+            }
+            df = fetch_events(conn, query_sql, event_params)
             logger.info(f"[OK] Construction Successful: found {len(df)} event{'s' if len(df)>1 else ''}.")
 
             # VALIDATION: Ensure query returned expected columns before proceeding
-            required_columns = ['id', 'event_name', 'created_at', 'email']
-            validate_dataframe_columns(df, required_columns, context="Events query result")
-
-            # Load query to extract type_name and status_name from corresponding IDs defined in .env from file
-            type_and_status_sql = load_sql_query(config('SQL_TYPE_AND_STATUS_FILE'))
-            type_and_status = text(type_and_status_sql)
-
-            # Execute new type and status query
-            logger.info(f"Extracting 'Event Type' from type_id = {EVENT_TYPE_ID}, and 'Status Name' from status_id = {EVENT_STATUS_ID}")
-            df_type_and_status = pd.read_sql_query(
-                    type_and_status,
-                    conn,
-                    params={
-                        'type_id': EVENT_TYPE_ID,
-                        'status_id': EVENT_STATUS_ID
-                    }
-            )
-            logger.info(f"--> CHECKING STATUS:")
-            
-            # Validate that type/status query returned expected columns
-            if not df_type_and_status.empty:
-                required_type_status_cols = ['type_name', 'status_name']
-                validate_dataframe_columns(df_type_and_status, required_type_status_cols,
-                                           context="Type/Status query result")
-
-            # Validate that ID column exists for link generation and deduplication
-            if not df.empty and 'id' not in df.columns:
-                logger.warning("Query result missing 'id' column - event links and deduplication will not work")
-            
-            # CRITICAL: Filter out events that have already been sent BEFORE creating company-specific DataFrames
-            original_count = len(df)
-            df = filter_unsent_events(df, sent_events)
-
-            # Format created_at for display (after filtering)
-            if not df.empty:
-                df['created_at'] = pd.to_datetime(df['created_at']).dt.strftime('%Y-%m-%d %H:%M:%S')
-            
-            # Check if we have new events to send
-            if df.empty:
-                if original_count > 0:
-                    logger.info(f"All {original_count} event(s) have been sent previously. No new events to notify.")
-                else:
-                    logger.info("No events found matching specified criteria.")
-                return  # Exit without sending notifications
-            
-            # We have new events - prepare notifications
-            logger.info(f"{len(df)} new event(s) to be sent.")
-
-            # NOW create company-specific DataFrames from the FILTERED df
-            logger.info('... PROMINENCE filter ...')
-            df_prominence = df[df['email'].str.contains('prominence', case=False, na=False)].copy()
-            if not df_prominence.empty:
-                df_prominence = df_prominence.drop(columns=['email'])
-                logger.info(f"Found {len(df_prominence)} prominence event(s) to send")
+            validate_dataframe_columns(df, REQUIRED_EVENT_COLUMNS, context="Events query result")
+
+            if REQUIRED_TYPE_STATUS_COLUMNS.issubset(df.columns):
+                # The events query already joined the type and status names (constant per row):
+                # take them from the first row instead of a second round-trip
+                # (the columns are dropped with the routing columns further down)
+                hidden_columns = ['type_name', 'status_name']
+                type_status_row = df.iloc[0][hidden_columns].to_dict() if not df.empty else None
+            elif not alerts_enabled:
+                # The names only feed the HTML, which is not rendered with every alert disabled
+                hidden_columns = []
+                type_status_row = None
             else:
-                logger.info("No prominence events to send")
+                hidden_columns = []
+
+                # Load query to extract type_name and status_name from corresponding IDs defined in .env from file
+                type_and_status_sql = load_sql_query(config('SQL_TYPE_AND_STATUS_FILE'))
+                type_and_status = text(type_and_status_sql)
+
+                # Execute new type and status query: only two scalars are used, so fetch one row (no DataFrame)
+                logger.info(f"Extracting 'Event Type' from type_id = {EVENT_TYPE_ID}, and 'Status Name' from status_id = {EVENT_STATUS_ID}")
+                result = conn.execute(
+                        type_and_status,
+                        {
+                            'type_id': EVENT_TYPE_ID,
+                            'status_id': EVENT_STATUS_ID
+                        }
+                ).mappings()
+                type_status_row = result.fetchone()
+
+                # Validate that type/status query returned expected columns
+                if type_status_row is not None:
+                    validate_columns(result.keys(), REQUIRED_TYPE_STATUS_COLUMNS,
+                                     context="Type/Status query result")
+
+        # The DB connection is released here: filtering, rendering and the SMTP/Teams
+        # I/O below only work on the fetched frames
+        logger.info(f"--> CHECKING STATUS:")
+        if type_status_row is None:
+            type_status = ('Default Type', 'Default Status')
+        else:
+            type_status = (str(type_status_row['type_name']), str(type_status_row['status_name']))
+            logger.info(f"Found: 'Event Type' = {type_status[0]}, 'Status Name' = {type_status[1]}")
 
-            logger.info('... SEATRADERS filter ...')
-            df_seatraders = df[df['email'].str.contains('seatraders', case=False, na=False)].copy()
-            if not df_seatraders.empty:
-                df_seatraders = df_seatraders.drop(columns=['email'])
-                logger.info(f"Found {len(df_seatraders)} seatraders event(s) to send")
-            else:
-                logger.info("No seatraders events to send")
+        # Validate that ID column exists for link generation and deduplication
+        if not df.empty and 'id' not in df.columns:
+            logger.warning("Query result missing 'id' column - event links and deduplication will not work")
+        
+        # CRITICAL: Filter out events that have already been sent BEFORE creating company-specific DataFrames
+        original_count = len(df)
+        df = filter_unsent_events(df, sent_events, sent_ids)
 
-            # Remove email column from main df for internal recipients
-            if 'email' in df.columns:
-                df = df.drop(columns=['email'])
-            
-            # Generate email content for internal recipients
-            subject = make_subject(len(df))
-            plain_text = make_plain_text(df, run_time)
-
-            # Check if logos exist for HTML
-            has_company_logo = COMPANY_LOGO.exists()
-            has_st_logo = ST_COMPANY_LOGO.exists()
-            event_ids, html_content = make_html(df, run_time, df_type_and_status, has_company_logo=has_company_logo, has_st_logo=has_st_logo)
-            trimmed_event_ids, trimmed_html_content = make_html(df, run_time, df_type_and_status, has_company_logo=False, has_st_logo=False)
-
-            # Initialize variables for company-specific content
-            event_ids_prominence = []
-            event_ids_seatraders = []
-
-            ##########################
-            ####### PROMINENCE #######
-            ##########################
-            if not df_prominence.empty:
-                logger.info('Generating PROMINENCE email content')
-                subject_prominence = make_subject(len(df_prominence))
-                plain_text_prominence = make_plain_text(df_prominence, run_time)
-                event_ids_prominence, html_content_prominence = make_html(df_prominence, run_time, df_type_and_status, has_company_logo=has_company_logo, has_st_logo=has_st_logo)
-                trimmed_event_ids_prominence, trimmed_html_content_prominence = make_html(df_prominence, run_time, df_type_and_status, has_company_logo=False, has_st_logo=False)
-            else:
-                logger.info("Skipping PROMINENCE email generation - no events")
-
-            ##########################
-            ####### SEATRADERS #######
-            ##########################
-            if not df_seatraders.empty:
-                logger.info('Generating SEATRADERS email content')
-                subject_seatraders = make_subject(len(df_seatraders))
-                plain_text_seatraders = make_plain_text(df_seatraders, run_time)
-                event_ids_seatraders, html_content_seatraders = make_html(df_seatraders, run_time, df_type_and_status, has_company_logo=has_company_logo, has_st_logo=has_st_logo)
-                trimmed_event_ids_seatraders, trimmed_html_content_seatraders = make_html(df_seatraders, run_time, df_type_and_status, has_company_logo=False, has_st_logo=False)
+        # Check if we have new events to send
+        if df.empty:
+            if original_count > 0:
+                logger.info(f"All {original_count} event(s) have been sent previously. No new events to notify.")
             else:
-                logger.info("Skipping SEATRADERS email generation - no events")
+                logger.info("No events found matching specified criteria.")
+            return  # Exit without sending notifications
+        
+        # We have new events - prepare notifications
+        logger.info(f"{len(df)} new event(s) to be sent.")
+
+        if not alerts_enabled:
+            logger.info(f"All alerts disabled; would notify {len(df)} event(s)")
+            return  # Nothing is sent, so nothing is marked as sent either
+
+        # NOW create company-specific DataFrames from the FILTERED df
+        if 'recipient_group' in df.columns:
+            # The events query already classified each row (CASE on the vessel email)
+            is_prominence = df['recipient_group'].eq('prominence').fillna(False).to_numpy(dtype=bool)
+            is_seatraders = df['recipient_group'].eq('seatraders').fillna(False).to_numpy(dtype=bool)
+        else:
+            # Lowercase the email column once, then plain substring tests (no regex) give both masks
+            email_lc = df['email'].str.lower()
+            is_prominence = email_lc.str.contains('prominence', regex=False, na=False).to_numpy(dtype=bool)
+            is_seatraders = email_lc.str.contains('seatraders', regex=False, na=False).to_numpy(dtype=bool)
+
+        # Routing and lookup columns are not shown to any recipient: drop them all in one copy, before partitioning
+        hidden_columns += [col for col in ('email', 'recipient_group') if col in df.columns]
+        df = df.drop(columns=hidden_columns)
+
+        # Format created_at for display (on the filtered, trimmed frame) as 'YYYY-MM-DD HH:MM:SS' wall time:
+        # a C-level cast to second-resolution ISO strings instead of per-element strftime
+        created_at = pd.DatetimeIndex(pd.to_datetime(df['created_at']))
+        if created_at.tz is not None:
+            created_at = created_at.tz_localize(None)
+        formatted = np.char.replace(created_at.to_numpy(dtype='datetime64[s]').astype(str), 'T', ' ').astype(object)
+        formatted[created_at.isna()] = np.nan
+        df['created_at'] = formatted
+        df = with_display_nulls(df)
+
+        logger.info('... PROMINENCE filter ...')
+        df_prominence = df.loc[is_prominence]
+        if not df_prominence.empty:
+            logger.info(f"Found {len(df_prominence)} prominence event(s) to send")
+        else:
+            logger.info("No prominence events to send")
 
-            
-            # Track if any notification was sent successfully
-            notifications_sent = False
-            notifications_sent_prominence = False
-            notifications_sent_seatraders = False
-            
+        logger.info('... SEATRADERS filter ...')
+        df_seatraders = df.loc[is_seatraders]
+        if not df_seatraders.empty:
+            logger.info(f"Found {len(df_seatraders)} seatraders event(s) to send")
+        else:
+            logger.info("No seatraders events to send")
+        
+        # Generate email content for internal recipients
+        subject = make_subject(len(df))
+        plain_text = make_plain_text(df, run_time)
+
+        # Check if logos exist for HTML
+        has_company_logo = HAS_COMPANY_LOGO
+        has_st_logo = HAS_ST_LOGO
+
+        # The recipient groups are row subsets of df with the same columns:
+        # render every table row once and slice the fragments per group
+        columns = df.columns
+        row_html = dict(zip(df.index, render_rows(df)))
+        fragments = list(row_html.values())
+
+        event_ids = df['id'].tolist()
+        html_content = wrap_html(fragments, columns, run_time, type_status, has_company_logo=has_company_logo, has_st_logo=has_st_logo)
+        trimmed_html_content = wrap_html(fragments, columns, run_time, type_status, has_company_logo=False, has_st_logo=False)
+
+        # Initialize variables for company-specific content
+        event_ids_prominence = []
+        event_ids_seatraders = []
+
+        ##########################
+        ####### PROMINENCE #######
+        ##########################
+        if not df_prominence.empty:
+            logger.info('Generating PROMINENCE email content')
+            subject_prominence = make_subject(len(df_prominence))
+            plain_text_prominence = make_plain_text(df_prominence, run_time)
+            event_ids_prominence = df_prominence['id'].tolist()
+            fragments_prominence = [row_html[i] for i in df_prominence.index]
+            html_content_prominence = wrap_html(fragments_prominence, columns, run_time, type_status, has_company_logo=has_company_logo, has_st_logo=has_st_logo)
+        else:
+            logger.info("Skipping PROMINENCE email generation - no events")
+
+        ##########################
+        ####### SEATRADERS #######
+        ##########################
+        if not df_seatraders.empty:
+            logger.info('Generating SEATRADERS email content')
+            subject_seatraders = make_subject(len(df_seatraders))
+            plain_text_seatraders = make_plain_text(df_seatraders, run_time)
+            event_ids_seatraders = df_seatraders['id'].tolist()
+            fragments_seatraders = [row_html[i] for i in df_seatraders.index]
+            html_content_seatraders = wrap_html(fragments_seatraders, columns, run_time, type_status, has_company_logo=has_company_logo, has_st_logo=has_st_logo)
+        else:
+            logger.info("Skipping SEATRADERS email generation - no events")
+
+        
+        # Notifications go to independent services, so they are sent concurrently:
+        # the cycle waits for the slowest send, not the sum of all of them.
+        # Emails share one SMTP connection (its lock serializes the writes,
+        # message construction still runs in parallel).
+        futures = {}
+        with SmtpSession() as smtp, ThreadPoolExecutor(max_workers=4) as pool:
             # Send email if enabled
             if ENABLE_EMAIL_ALERTS:
                 # Send to internal recipients
-                try:
-                    logger.info(f"Preparing to send email to: {', '.join(INTERNAL_RECIPIENTS)}")
-                    send_email(subject, plain_text, html_content, INTERNAL_RECIPIENTS)
-                    notifications_sent = True
-                except Exception as e:
-                    logger.error(f"Internal email sending failed: {e}")
+                logger.info(f"Preparing to send email to: {', '.join(INTERNAL_RECIPIENTS)}")
+                futures['internal'] = pool.submit(send_email, subject, plain_text, html_content, INTERNAL_RECIPIENTS, smtp)
 
                 # Send to prominence recipients (only if we have events)
                 if not df_prominence.empty:
-                    try:
-                        logger.info(f"Preparing to send email to: {', '.join(PROMINENCE_EMAIL_RECIPIENTS)}")
-                        send_email(subject_prominence, plain_text_prominence, html_content_prominence, PROMINENCE_EMAIL_RECIPIENTS)
-                        notifications_sent_prominence = True
-                    except Exception as e:
-                        logger.error(f"Prominence email sending failed: {e}")
+                    logger.info(f"Preparing to send email to: {', '.join(PROMINENCE_EMAIL_RECIPIENTS)}")
+                    futures['prominence'] = pool.submit(send_email, subject_prominence, plain_text_prominence, html_content_prominence, PROMINENCE_EMAIL_RECIPIENTS, smtp)
                 else:
                     logger.info("Skipping PROMINENCE email send - no events")
 
                 # Send to seatraders recipients (only if we have events)
                 if not df_seatraders.empty:
-                    try:
-                        logger.info(f"Preparing to send email to: {', '.join(SEATRADERS_EMAIL_RECIPIENTS)}")
-                        send_email(subject_seatraders, plain_text_seatraders, html_content_seatraders, SEATRADERS_EMAIL_RECIPIENTS)
-                        notifications_sent_seatraders = True
-                    except Exception as e:
-                        logger.error(f"Seatraders email sending failed: {e}")
+                    logger.info(f"Preparing to send email to: {', '.join(SEATRADERS_EMAIL_RECIPIENTS)}")
+                    futures['seatraders'] = pool.submit(send_email, subject_seatraders, plain_text_seatraders, html_content_seatraders, SEATRADERS_EMAIL_RECIPIENTS, smtp)
                 else:
                     logger.info("Skipping SEATRADERS email send - no events")
             else:
                 logger.info("EMAIL ALERTS DISABLED: NO EMAIL SENT.")
-            
+
             # Send special Teams email if enabled
             if ENABLE_SPECIAL_TEAMS_EMAIL_ALERT:
-                try:
-                    logger.info(f"Preparing to send Email to Teams Alert Channel: {SPECIAL_TEAMS_EMAIL}")
-                    special_email = [SPECIAL_TEAMS_EMAIL]
-                    send_email(subject, plain_text, trimmed_html_content, special_email)
-                    notifications_sent = True
-                except Exception as e:
-                    logger.error(f"Special Teams email sending failed: {e}")
+                logger.info(f"Preparing to send Email to Teams Alert Channel: {SPECIAL_TEAMS_EMAIL}")
+                special_email = [SPECIAL_TEAMS_EMAIL]
+                futures['special_teams_email'] = pool.submit(send_email, subject, plain_text, trimmed_html_content, special_email, smtp)
             else:
                 logger.info("Special Teams email alerts disabled: no channel email sent")
 
             # Send Teams message if enabled
             if ENABLE_TEAMS_ALERTS:
-                try:
-                    logger.info("Preparing to send Teams notification...")
-                    send_teams_message(df, run_time)
-                    notifications_sent = True
-                except Exception as e:
-                    logger.error(f"Teams notification failed: {e}")
+                logger.info("Preparing to send Teams notification...")
+                futures['teams'] = pool.submit(send_teams_message, df, run_time)
             else:
                 logger.info("Teams alerts disabled: no Teams notification sent.")
-            
-            # Collect all successfully sent event IDs and save once
-            all_sent_event_ids = set()
-
-            if notifications_sent and event_ids:
-                logger.info(f"Adding {len(event_ids)} internal event ID(s) to sent tracking")
-                all_sent_event_ids.update(event_ids)
-                
-            if notifications_sent_prominence and event_ids_prominence:
-                logger.info(f"Adding {len(event_ids_prominence)} prominence event ID(s) to sent tracking")
-                all_sent_event_ids.update(event_ids_prominence)
-                
-            if notifications_sent_seatraders and event_ids_seatraders:
-                logger.info(f"Adding {len(event_ids_seatraders)} seatraders event ID(s) to sent tracking")
-                all_sent_event_ids.update(event_ids_seatraders)
-
-            # Save all sent events at once
-            if all_sent_event_ids:
-                current_timestamp = run_time.isoformat()
-                logger.info(f"Marking {len(all_sent_event_ids)} total unique event(s) as sent at {current_timestamp}")
-
-                for event_id in all_sent_event_ids:
-                    sent_events[event_id] = current_timestamp
-
-                save_sent_events(sent_events)
-            else:
-                logger.warning("No notifications were sent successfully. Event IDs will NOT be marked as sent.")
+
+        # Surface each send's outcome (the pool has already waited for all of them)
+        failure_messages = {
+            'internal': "Internal email sending failed",
+            'prominence': "Prominence email sending failed",
+            'seatraders': "Seatraders email sending failed",
+            'special_teams_email': "Special Teams email sending failed",
+            'teams': "Teams notification failed",
+        }
+        succeeded = set()
+        for name, future in futures.items():
+            try:
+                future.result()
+                succeeded.add(name)
+            except Exception as e:
+                logger.error(f"{failure_messages[name]}: {e}")
+
+        # Track if any notification was sent successfully
+        notifications_sent = bool(succeeded & {'internal', 'special_teams_email', 'teams'})
+        notifications_sent_prominence = 'prominence' in succeeded
+        notifications_sent_seatraders = 'seatraders' in succeeded
+        
+        # Collect all successfully sent event IDs and save once
+        delivered = [
+            (label, ids)
+            for label, ids, sent in (
+                ('internal', event_ids, notifications_sent),
+                ('prominence', event_ids_prominence, notifications_sent_prominence),
+                ('seatraders', event_ids_seatraders, notifications_sent_seatraders),
+            )
+            if sent and ids
+        ]
+        for label, ids in delivered:
+            logger.info(f"Adding {len(ids)} {label} event ID(s) to sent tracking")
+        all_sent_event_ids = set().union(*(ids for _, ids in delivered))
+
+        # Save all sent events at once
+        if all_sent_event_ids:
+            current_timestamp = run_time.isoformat()
+            logger.info(f"Marking {len(all_sent_event_ids)} total unique event(s) as sent at {current_timestamp}")
+
+            sent_events.update(dict.fromkeys(all_sent_event_ids, current_timestamp))
+
+            save_sent_events(sent_events, run_time)
+            cleanup_pending = False
+        else:
+            logger.warning("No notifications were sent successfully. Event IDs will NOT be marked as sent.")
 
     except (ConnectionError, smtplib.SMTPException) as e:
         # Network/SMTP errors - might be transient, log but don't exit
@@ -1085,16 +1479,31 @@ def main():
         # For unexpected errors in production, you might want to send alert to monitoring system
         
     finally:
+        if cleanup_pending:
+            # Nothing was saved this run (no new events, nothing delivered or an error):
+            # write the expiry cleanup back on its own (a failure is logged by save_sent_events)
+            with contextlib.suppress(Exception):
+                save_sent_events(sent_events, run_time)
         logger.info("◼ RUN COMPLETE")
-        logger.info("━" * 60)            
+        logger.info("━" * 60)
+        # Write the run's log records out now (the Docker healthcheck watches the log file's mtime)
+        buffered_handler.flush()            
 
 
 def duration(hours: float) -> str:
     "Converts float representation of hours to the format #h #m #s"
-    H = str(pd.Timedelta(hours=hours).components.hours)+'h ' if pd.Timedelta(hours=hours).components.hours else ' '
-    M = str(pd.Timedelta(hours=hours).components.minutes)+'m ' if pd.Timedelta(hours=hours).components.minutes else ' '
-    S = str(pd.Timedelta(hours=hours).components.seconds)+'s' if pd.Timedelta(hours=hours).components.seconds else ' '
-    return str(H + M + S).strip()
+    # Whole seconds via divmod (rounded at microseconds, as a timedelta would be)
+    total = int(round(hours * 3600, 6))
+    h, rem = divmod(total, 3600)
+    m, sec = divmod(rem, 60)
+    parts = []
+    if h:
+        parts.append(f"{h}h")
+    if m:
+        parts.append(f"{m}m")
+    if sec:
+        parts.append(f"{sec}s")
+    return " ".join(parts) or "0s"
 
 
 def run_scheduler():
@@ -1102,8 +1511,14 @@ def run_scheduler():
     Continuously run the alerts system at intervals specified by SCHEDULE_FREQUENCY.
     Runs immediately on startup, then waits SCHEDULE_FREQUENCY hours between runs.
     """
+    # The interval is fixed for the process: format it and build its timedelta once
+    frequency_text = duration(SCHEDULE_FREQUENCY)
+    sleep_delta = timedelta(hours=SCHEDULE_FREQUENCY)
+    sleep_seconds = sleep_delta.total_seconds()
+
     logger.info("━" * 60)
-    logger.info(f"▶ Scheduler Started - Running every {duration(SCHEDULE_FREQUENCY)}")
+    logger.info(f"▶ Scheduler Started - Running every {frequency_text}")
+    logger.info(f"Preloaded {preload_sql_queries()} SQL query file(s) from {QUERIES_DIR}")
 
     while not shutdown_event.is_set():
         try:
@@ -1114,10 +1529,10 @@ def run_scheduler():
             if shutdown_event.is_set():
                 break
 
-            # Calculate sleep time in seconds
-            sleep_seconds = SCHEDULE_FREQUENCY * 3600
-            logger.info(f"Sleeping for {duration(SCHEDULE_FREQUENCY)}")
-            logger.info(f"Next run scheduled at: {(datetime.now(tz=LOCAL_TZ) + timedelta(hours=SCHEDULE_FREQUENCY)).strftime('%Y-%m-%d %H:%M:%S %Z')}")
+            logger.info(f"Sleeping for {frequency_text}")
+            next_run = datetime.now(tz=LOCAL_TZ) + sleep_delta
+            logger.info(f"Next run scheduled at: {next_run.strftime('%Y-%m-%d %H:%M:%S %Z')}")
+            buffered_handler.flush()
 
             # Use shutdown_event.wait() for efficient interruptible sleep
             # Returns True if event was set (shutdown requested), False if timeout
@@ -1137,6 +1552,9 @@ def run_scheduler():
                     logger.info("Shutdown requested during error recovery wait")
                     break
 
+    # The engine pool and SSH tunnel live across runs; release them once, on the way out
+    close_db()
+
     logger.info("━" * 60)
     logger.info("⏹Scheduler Stopped")
     logger.info("━" * 60)
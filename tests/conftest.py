@@ -3,11 +3,15 @@
 Pytest configuration and shared fixtures for events_alerts tests
 """
 import pytest
-import json
+import orjson
+import re
+import socket
+import ssl
 import pandas as pd
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
+from freezegun import freeze_time
 from unittest.mock import Mock, MagicMock
 import tempfile
 import shutil
@@ -16,17 +20,96 @@ import shutil
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+# Imported once for the whole session; test modules use the same `ea` module object
+from src import events_alerts as ea
+
+
+# ---------------------------------------
+# Stubs
+# ---------------------------------------
+# Plain classes with only the methods events_alerts calls: cheaper per call than
+# MagicMock and they count calls in attributes the tests assert on directly.
+class StubSMTP:
+    """SMTP connection stub; calling it (as smtplib.SMTP/SMTP_SSL) opens a 'connection'"""
+
+    def __init__(self):
+        self.connections = []
+        self.ehlo_calls = 0
+        self.starttls_calls = 0
+        self.login_calls = 0
+        self.quit_calls = 0
+        self.sent = []
+
+    def __call__(self, *args, **kwargs):
+        self.connections.append((args, kwargs))
+        return self
+
+    def ehlo(self):
+        self.ehlo_calls += 1
+
+    def starttls(self):
+        self.starttls_calls += 1
+
+    def login(self, user, password):
+        self.login_calls += 1
+
+    def send_message(self, msg):
+        self.sent.append(msg)
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+class StubResponse:
+    """HTTP response stub; raise_for_status() raises `error` when set"""
+
+    def __init__(self, status_code=200, error=None, text='1'):
+        self.status_code = status_code
+        self.error = error
+        self.text = text
+
+    def raise_for_status(self):
+        if self.error is not None:
+            raise self.error
+
+
+class StubTeamsSession:
+    """requests.Session stub recording the keyword arguments of every post"""
+
+    def __init__(self):
+        self.response = StubResponse()
+        self.posts = []
+
+    def post(self, url, **kwargs):
+        self.posts.append(kwargs)
+        return self.response
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Start every test with empty query/event-name caches"""
+    ea.invalidate_caches()
+    yield
+    ea.invalidate_caches()
+
+
+@pytest.fixture(scope='session')
+def _projects_root(tmp_path_factory):
+    """One base directory per session (per xdist worker) holding every test's project tree"""
+    return tmp_path_factory.mktemp('projects')
+
 
 @pytest.fixture
-def temp_project_root(tmp_path):
+def temp_project_root(_projects_root, request):
     """Create a temporary project structure for testing"""
-    # Create directory structure
-    (tmp_path / 'data').mkdir()
-    (tmp_path / 'logs').mkdir()
-    (tmp_path / 'queries').mkdir()
-    (tmp_path / 'media').mkdir()
-    
-    return tmp_path
+    # The test name is only a readable prefix: mkdtemp makes the directory unique,
+    # since ids such as 'a-b' and 'a_b' sanitize to the same name
+    prefix = re.sub(r'\W+', '_', request.node.name).strip('_') + '_'
+    root = Path(tempfile.mkdtemp(prefix=prefix, dir=_projects_root))
+    for subdir in ('data', 'logs', 'queries', 'media'):
+        (root / subdir).mkdir()
+
+    return root
 
 
 @pytest.fixture
@@ -54,28 +137,44 @@ def empty_event_data():
     return pd.DataFrame(columns=['id', 'event_name', 'created_at', 'status'])
 
 
-@pytest.fixture
-def sample_sent_events(local_tz):
-    """Sample sent events with timestamps"""
-    from datetime import datetime, timedelta
-    now = datetime.now(local_tz)
+@pytest.fixture(scope='session')
+def sample_sent_events(fixed_datetime):
+    """Sample sent events with timestamps (relative to fixed_datetime, so built once per session)"""
     return {
-        99: (now - timedelta(days=5)).isoformat(),  # 5 days ago
-        100: (now - timedelta(days=3)).isoformat()  # 3 days ago
+        99: (fixed_datetime - timedelta(days=5)).isoformat(),  # 5 days ago
+        100: (fixed_datetime - timedelta(days=3)).isoformat()  # 3 days ago
     }
 
 
-@pytest.fixture
-def sent_events_json(temp_project_root, sample_sent_events):
-    """Create a sent_events.json file"""
-    sent_events_file = temp_project_root / 'data' / 'sent_events.json'
+@pytest.fixture(scope='session')
+def sent_events_payload(sample_sent_events):
+    """Serialized sent_events.json for sample_sent_events (encoded once per session)"""
     data = {
         'sent_events': {str(k): v for k, v in sample_sent_events.items()},
         'last_updated': '2025-10-28T15:30:00+02:00',
         'total_count': len(sample_sent_events)
     }
-    with open(sent_events_file, 'w') as f:
-        json.dump(data, f, indent=2)
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+
+
+@pytest.fixture(scope='session')
+def old_and_recent_payload(fixed_datetime):
+    """Serialized sent_events.json with one expired (40 days) and one recent (10 days) event"""
+    data = {
+        'sent_events': {
+            '500': (fixed_datetime - timedelta(days=40)).isoformat(),
+            '501': (fixed_datetime - timedelta(days=10)).isoformat()
+        },
+        'last_updated': fixed_datetime.isoformat()
+    }
+    return orjson.dumps(data)
+
+
+@pytest.fixture
+def sent_events_json(temp_project_root, sent_events_payload):
+    """Create a sent_events.json file"""
+    sent_events_file = temp_project_root / 'data' / 'sent_events.json'
+    sent_events_file.write_bytes(sent_events_payload)
     return sent_events_file
 
 
@@ -93,24 +192,119 @@ def mock_db_connection():
 
 @pytest.fixture
 def mock_smtp():
-    """Mock SMTP server"""
-    mock_server = MagicMock()
-    mock_server.__enter__ = Mock(return_value=mock_server)
-    mock_server.__exit__ = Mock(return_value=False)
-    return mock_server
+    """Stub SMTP server"""
+    return StubSMTP()
+
+
+# SMTP settings shared by the send_email tests (port picks SSL vs STARTTLS)
+SMTP_TEST_SETTINGS = {
+    'SMTP_HOST': 'smtp.test.com',
+    'SMTP_USER': 'test@test.com',
+    'SMTP_PASS': 'password',
+}
 
 
 @pytest.fixture
-def mock_teams_webhook():
-    """Mock Teams webhook response"""
-    mock_card = MagicMock()
-    mock_card.send.return_value = True
-    mock_card.last_http_response = MagicMock()
-    mock_card.last_http_response.status_code = 200
-    return mock_card
+def smtp_ssl_env(monkeypatch):
+    """Point events_alerts at a test SMTP server on the SSL port (465)"""
+    for name, value in {**SMTP_TEST_SETTINGS, 'SMTP_PORT': 465}.items():
+        monkeypatch.setattr(ea, name, value)
+
+
+@pytest.fixture
+def smtp_starttls_env(monkeypatch):
+    """Point events_alerts at a test SMTP server on the STARTTLS port (587)"""
+    for name, value in {**SMTP_TEST_SETTINGS, 'SMTP_PORT': 587}.items():
+        monkeypatch.setattr(ea, name, value)
+
+
+class SmtpSink:
+    """aiosmtpd handler keeping every envelope the fake server accepts"""
+
+    def __init__(self):
+        self.envelopes = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.envelopes.append(envelope)
+        return '250 Message accepted for delivery'
+
+
+def _self_signed_context(directory: Path) -> ssl.SSLContext:
+    """Server TLS context with a throwaway localhost certificate (cryptography comes with paramiko)"""
+    x509 = pytest.importorskip('cryptography.x509')
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(x509.oid.NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.now(tz=ZoneInfo('UTC'))
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    cert_file, key_file = directory / 'cert.pem', directory / 'key.pem'
+    cert_file.write_bytes(cert.public_bytes(serialization.Encoding.PEM))
+    key_file.write_bytes(key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ))
+
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(cert_file, key_file)
+    return context
+
+
+@pytest.fixture(scope='session')
+def smtp_server(tmp_path_factory):
+    """
+    In-process STARTTLS + AUTH SMTP server (aiosmtpd) on a free localhost port, started once per session.
+    Only the STARTTLS path can use it: SmtpSession picks implicit SSL by port 465 alone.
+    """
+    controller_module = pytest.importorskip('aiosmtpd.controller')
+    from aiosmtpd.smtp import AuthResult
+
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+
+    sink = SmtpSink()
+    controller = controller_module.Controller(
+        sink,
+        hostname='127.0.0.1',
+        port=port,
+        tls_context=_self_signed_context(tmp_path_factory.mktemp('smtp')),
+        require_starttls=True,
+        authenticator=lambda server, session, envelope, mechanism, auth_data: AuthResult(success=True)
+    )
+    controller.start()
+    yield controller, sink
+    controller.stop()
+
+
+@pytest.fixture
+def smtp_server_env(smtp_server, monkeypatch):
+    """Point events_alerts at the fake SMTP server; yields its handler with no envelopes yet"""
+    controller, sink = smtp_server
+    for name, value in {**SMTP_TEST_SETTINGS, 'SMTP_HOST': controller.hostname, 'SMTP_PORT': controller.port}.items():
+        monkeypatch.setattr(ea, name, value)
+    sink.envelopes.clear()
+    return sink
 
 
 @pytest.fixture
+def mock_teams_webhook():
+    """Stub Teams webhook session answering every post with HTTP 200"""
+    return StubTeamsSession()
+
+
+@pytest.fixture(scope='session')
 def local_tz():
     """Europe/Athens timezone"""
     return ZoneInfo('Europe/Athens')
@@ -122,13 +316,20 @@ def event_status_id():
     return 3
 
 
-@pytest.fixture
+@pytest.fixture(scope='session')
 def fixed_datetime(local_tz):
     """Fixed datetime for testing"""
     return datetime(2025, 10, 29, 9, 41, 19, tzinfo=local_tz)
 
 
+@pytest.fixture
+def frozen_time(fixed_datetime):
+    """Freeze the clock at fixed_datetime, so datetime.now() inside events_alerts returns it"""
+    with freeze_time(fixed_datetime) as frozen:
+        yield frozen
+
+
 @pytest.fixture
 def mock_smtp_class(mock_smtp):
-    """Mock SMTP class that returns configured mock_smtp instance"""
-    return MagicMock(return_value=mock_smtp)
+    """Stand-in for smtplib.SMTP/SMTP_SSL: every connection returns the mock_smtp instance"""
+    return mock_smtp
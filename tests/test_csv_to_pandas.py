@@ -0,0 +1,184 @@
+# tests/test_csv_to_pandas.py
+"""
+Tests for the vessel attendance pivot script
+"""
+import pandas as pd
+import pytest
+
+from scripts import csv_to_pandas as ctp
+
+
+ATTENDANCES_CSV = """\
+vessel_id,vessel,event_id,event_name,department_name,days_ago,event_type_id,event_type_name
+1,Alpha,10,Survey,Technical,5,1,Audit
+1,Alpha,11,Survey,Technical,-3,1,Audit
+1,Alpha,12,Survey,Technical,-1,1,Audit
+1,Alpha,13,Survey,Crewing,7,1,Audit
+1,Alpha,14,Survey,Crewing,2,1,Audit
+2,Bravo,15,Survey,Technical,NULL,1,Audit
+2,Bravo,16,Survey,Safety,4,1,Audit
+3,Charlie,17,Survey,Crewing,NULL,1,Audit
+3,Charlie,18,Survey,Technical,NULL,1,Audit
+4,Delta,19,Survey,Marine,-8,1,Audit
+4,Delta,20,Survey,Marine,NULL,1,Audit
+5,Echo,21,Survey,Safety,12,1,Audit
+6,NULL,22,Survey,Safety,3,1,Audit
+7,Foxtrot,23,Survey,NULL,3,1,Audit
+8,Golf,24,Survey,Void,NULL,1,Audit
+"""
+
+
+@pytest.fixture
+def attendances_csv(tmp_path):
+    """Attendance export with NULL days_ago, an all-NULL vessel and NULL keys"""
+    csv_filepath = tmp_path / 'vessel_attendances.csv'
+    csv_filepath.write_text(ATTENDANCES_CSV, encoding='utf-8')
+    return csv_filepath
+
+
+def baseline_pivot(csv_filepath) -> pd.DataFrame:
+    """The original whole-file pivot_table implementation, kept as the reference"""
+    df_raw = pd.read_csv(csv_filepath, na_values=['NULL'], encoding='utf-8')
+    df = df_raw[ctp.COLS_TO_KEEP].pivot_table(
+            index=['vessel'],
+            columns='department_name',
+            values='days_ago',
+            aggfunc=lambda x: x[x < 0].max() if not x[x < 0].empty else x.min()
+    ).reset_index()
+    df.columns.name = None
+    df = df.rename(columns={'vessel': 'Vessel'})
+    return df
+
+
+@pytest.mark.parametrize('chunksize', [2, ctp.CHUNKSIZE, None], ids=['chunked', 'one_chunk', 'whole_file'])
+def test_df_after_pivot_matches_pivot_table(attendances_csv, chunksize):
+    """Test the streamed pivot returns exactly what pivot_table returned"""
+    df = ctp.df_after_pivot(ctp.df_from_csv(attendances_csv, chunksize=chunksize))
+
+    pd.testing.assert_frame_equal(df, baseline_pivot(attendances_csv))
+
+
+def test_df_after_pivot_drops_vessels_without_days(attendances_csv):
+    """Test vessels and departments whose days_ago are all NULL get no row or column"""
+    df = ctp.df_after_pivot(ctp.df_from_csv(attendances_csv))
+
+    assert list(df['Vessel']) == ['Alpha', 'Bravo', 'Delta', 'Echo']
+    assert list(df.columns) == ['Vessel', 'Crewing', 'Marine', 'Safety', 'Technical']
+    assert df.loc[df['Vessel'] == 'Alpha', 'Technical'].item() == -1.0
+
+
+def test_arrow_from_csv_reads_null_keys_as_null(attendances_csv):
+    """Test 'NULL' vessel and department cells become nulls, not the text 'NULL'"""
+    table = ctp.arrow_from_csv(attendances_csv)
+
+    assert table.column('vessel').null_count == 1
+    assert table.column('department_name').null_count == 1
+    assert 'NULL' not in table.column('vessel').to_pylist()
+
+
+def test_df_pivot_duckdb_matches_pivot_table(attendances_csv):
+    """Test the DuckDB pivot drops the same all-NULL vessels as pivot_table"""
+    pytest.importorskip('duckdb')
+
+    df = ctp.df_pivot_duckdb(attendances_csv)
+
+    pd.testing.assert_frame_equal(df, baseline_pivot(attendances_csv))
+
+
+@pytest.mark.parametrize('chunksize', [ctp.CHUNKSIZE, None], ids=['streamed', 'whole_file'])
+def test_df_from_csv_accepts_blank_event_id(tmp_path, chunksize):
+    """Test an empty event_id cell is read as NA instead of failing the int column"""
+    csv_filepath = tmp_path / 'vessel_attendances.csv'
+    csv_filepath.write_text(ATTENDANCES_CSV.replace(',Alpha,10,', ',Alpha,,'), encoding='utf-8')
+
+    df = ctp.df_after_pivot(ctp.df_from_csv(csv_filepath, chunksize=chunksize))
+
+    pd.testing.assert_frame_equal(df, baseline_pivot(csv_filepath))
+
+
+PIVOT_PATHS = {
+    'chunked': lambda csv_filepath: ctp.df_after_pivot(ctp.df_from_csv(csv_filepath)),
+    'whole_file': lambda csv_filepath: ctp.df_after_pivot(ctp.df_from_csv(csv_filepath, chunksize=None)),
+    'numba': lambda csv_filepath: ctp.df_after_pivot_numba(ctp.df_from_csv(csv_filepath, chunksize=None)),
+    'duckdb': lambda csv_filepath: ctp.df_pivot_duckdb(csv_filepath),
+}
+
+
+@pytest.mark.parametrize('path', PIVOT_PATHS)
+def test_pivot_accepts_fractional_days_ago(tmp_path, path):
+    """Test a non-integer days_ago is pivoted as the baseline did instead of failing the read"""
+    if path in ('numba', 'duckdb'):
+        pytest.importorskip(path)
+    csv_filepath = tmp_path / 'vessel_attendances.csv'
+    csv_filepath.write_text(ATTENDANCES_CSV.replace('Technical,-1,', 'Technical,-2.5,'), encoding='utf-8')
+
+    df = PIVOT_PATHS[path](csv_filepath)
+
+    assert df.loc[df['Vessel'] == 'Alpha', 'Technical'].item() == -2.5
+    pd.testing.assert_frame_equal(df, baseline_pivot(csv_filepath))
+
+
+@pytest.mark.parametrize('path', PIVOT_PATHS)
+@pytest.mark.parametrize('key', ['vessel', 'department_name'])
+def test_pivot_all_null_key_column(tmp_path, key, path):
+    """Test a key column that is all NULL gives the empty pivot the baseline returned"""
+    if path in ('numba', 'duckdb'):
+        pytest.importorskip(path)
+    rows = ['vessel,event_id,department_name,days_ago', 'Alpha,1,Technical,5', 'Bravo,2,Crewing,-3']
+    if key == 'vessel':
+        rows[1:] = ['NULL,1,Technical,5', 'NULL,2,Crewing,-3']
+    else:
+        rows[1:] = ['Alpha,1,NULL,5', 'Bravo,2,NULL,-3']
+    csv_filepath = tmp_path / 'vessel_attendances.csv'
+    csv_filepath.write_text('\n'.join(rows) + '\n', encoding='utf-8')
+
+    df = PIVOT_PATHS[path](csv_filepath)
+
+    assert df.empty
+    assert list(df.columns) == ['Vessel']
+    # pivot_table typed the empty Vessel column float64 (inferred from the all-NaN column)
+    pd.testing.assert_frame_equal(df, baseline_pivot(csv_filepath), check_dtype=False)
+
+
+def test_df_after_pivot_numba_matches_pivot_table(attendances_csv):
+    """Test the numba kernel drops all-NULL vessels and returns the baseline layout"""
+    pytest.importorskip('numba')
+
+    df = ctp.df_after_pivot_numba(ctp.df_from_csv(attendances_csv, chunksize=None))
+
+    pd.testing.assert_frame_equal(df, baseline_pivot(attendances_csv))
+
+
+def test_pivot_paths_agree(attendances_csv):
+    """Test __main__ prints the same table whichever optional engine is installed"""
+    pytest.importorskip('duckdb')
+    pytest.importorskip('numba')
+
+    pandas_df = ctp.df_after_pivot(ctp.df_from_csv(attendances_csv))
+    numba_df = ctp.df_after_pivot_numba(ctp.df_from_csv(attendances_csv, chunksize=None))
+    duckdb_df = ctp.df_pivot_duckdb(attendances_csv)
+
+    pd.testing.assert_frame_equal(numba_df, pandas_df)
+    pd.testing.assert_frame_equal(duckdb_df, pandas_df)
+    assert numba_df.to_string() == pandas_df.to_string() == duckdb_df.to_string()
+
+
+@pytest.mark.parametrize('path', PIVOT_PATHS)
+@pytest.mark.parametrize('extra_row,expected_dtype', [
+    ('', 'int64'),
+    ('Bravo,5,Crewing,NULL', 'float64'),
+    ('Charlie,5,Crewing,3', 'float64'),
+], ids=['dense', 'null_days_ago', 'empty_cell'])
+def test_pivot_cell_dtype_matches_pivot_table(tmp_path, path, extra_row, expected_dtype):
+    """Test cells stay int64 only where pivot_table kept them int64"""
+    if path in ('numba', 'duckdb'):
+        pytest.importorskip(path)
+    rows = ['vessel,event_id,department_name,days_ago',
+            'Alpha,1,Crewing,5', 'Alpha,2,Technical,-3', 'Bravo,3,Crewing,2', 'Bravo,4,Technical,1']
+    csv_filepath = tmp_path / 'vessel_attendances.csv'
+    csv_filepath.write_text('\n'.join(rows + [extra_row]) + '\n', encoding='utf-8')
+
+    df = PIVOT_PATHS[path](csv_filepath)
+
+    assert {str(dtype) for dtype in df.dtypes.drop('Vessel')} == {expected_dtype}
+    pd.testing.assert_frame_equal(df, baseline_pivot(csv_filepath))
@@ -0,0 +1,52 @@
+# tests/test_email_checker.py
+"""
+Tests for the pooled SMTP session of the email checker script
+"""
+import smtplib
+from email.message import EmailMessage
+
+import pytest
+
+from scripts import email_checker
+
+
+class FlakySMTP:
+    """SMTP connection stub whose NOOP/QUIT raise `error` once the link has dropped"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    def noop(self):
+        if self.error is not None:
+            raise self.error
+        return 250, b'OK'
+
+    def quit(self):
+        if self.error is not None:
+            raise self.error
+
+    def send_message(self, msg):
+        self.sent.append(msg['Subject'])
+
+
+@pytest.mark.parametrize('error', [
+    ConnectionResetError(104, 'Connection reset by peer'),
+    smtplib.SMTPResponseException(421, b'Service not available, closing channel'),
+    smtplib.SMTPServerDisconnected('Connection unexpectedly closed'),
+], ids=['reset', 'reply_421', 'disconnected'])
+def test_smtp_session_reconnects_after_dropped_link(monkeypatch, error):
+    """Test a dead connection is replaced instead of aborting the batch"""
+    dropped, fresh = FlakySMTP(), FlakySMTP()
+    connections = iter([dropped, fresh])
+    monkeypatch.setattr(email_checker, '_connect', lambda: next(connections))
+    msg = EmailMessage()
+    msg['Subject'] = 'Test Email'
+
+    with email_checker.smtp_session() as send:
+        send(msg)
+        dropped.error = error
+        send(msg)
+
+    assert dropped.sent == ['Test Email']
+    assert fresh.sent == ['Test Email']
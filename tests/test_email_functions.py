@@ -6,14 +6,15 @@ import pytest
 from unittest.mock import patch, MagicMock
 import pandas as pd
 
+from src import events_alerts as ea
+
 
 def test_make_subject_single_event(mock_db_connection):
     """Test subject line generation for single event"""
-    from src.events_alerts import make_subject
 
     with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection):
         with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
-            subject = make_subject(1, type_id=18)
+            subject = ea.make_subject(1, type_id=18)
 
             assert 'AlertDev' in subject
             assert '1' in subject
@@ -23,23 +24,43 @@ def test_make_subject_single_event(mock_db_connection):
 
 def test_make_subject_multiple_events(mock_db_connection):
     """Test subject line generation for multiple events"""
-    from src.events_alerts import make_subject
 
     with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection):
         with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
-            subject = make_subject(5, type_id=18)
+            subject = ea.make_subject(5, type_id=18)
 
             assert 'AlertDev' in subject
             assert '5' in subject
             assert 'Events' in subject  # Plural
 
 
+def test_make_subject_caches_event_name(mock_db_connection):
+    """Test event type name is fetched from the DB once per type_id"""
+
+    with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection) as mock_conn:
+        with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
+            ea.make_subject(1, type_id=18)
+            ea.make_subject(5, type_id=18)
+
+            assert mock_conn.call_count == 1
+
+
+def test_subject_and_html_share_event_name_lookup(sample_event_data, fixed_datetime, mock_db_connection):
+    """Test make_subject and make_html reuse one cached event type lookup"""
+
+    with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection) as mock_conn:
+        with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
+            ea.make_subject(len(sample_event_data), type_id=ea.EVENT_TYPE_ID)
+            ea.make_html(sample_event_data, fixed_datetime)
+
+            assert mock_conn.call_count == 1
+
+
 def test_make_plain_text_with_events(sample_event_data, fixed_datetime):
     """Test plain text email generation with events"""
-    from src.events_alerts import make_plain_text
 
     with patch('src.events_alerts.COMPANY_NAME', 'Test Company'):
-        text = make_plain_text(sample_event_data, fixed_datetime)
+        text = ea.make_plain_text(sample_event_data, fixed_datetime)
 
         assert 'AlertDev' in text
         assert '2 event(s)' in text
@@ -49,47 +70,62 @@ def test_make_plain_text_with_events(sample_event_data, fixed_datetime):
         assert 'Test Company' in text
 
 
+def test_email_tables_show_null_as_none(sample_event_data, fixed_datetime):
+    """Test NULL cells of an Arrow-backed frame render as None/nan, as the NumPy frames did"""
+    events = sample_event_data.assign(
+        status=['active', None],
+        hours=[3, None],
+    ).convert_dtypes(dtype_backend='pyarrow')
+
+    df = ea.with_display_nulls(events)
+    text = ea.make_plain_text(df, fixed_datetime)
+    rows = ea.render_rows(df)
+
+    assert '<NA>' not in text and '<NA>' not in ''.join(rows)
+    assert 'status: None' in text
+    assert 'hours: nan' in text and 'hours: 3.0' in text
+    assert '<td>None</td>' in rows[1]
+    assert events['id'].dtype == df['id'].dtype  # columns without NULLs are left as they are
+
+
 def test_make_plain_text_empty(empty_event_data, fixed_datetime):
     """Test plain text email generation with no events"""
-    from src.events_alerts import make_plain_text
 
     with patch('src.events_alerts.COMPANY_NAME', 'Test Company'):
-        text = make_plain_text(empty_event_data, fixed_datetime)
+        text = ea.make_plain_text(empty_event_data, fixed_datetime)
 
         assert 'No results found' in text
         assert 'Test Company' in text
 
 
-def test_make_html_with_events(sample_event_data, fixed_datetime, mock_db_connection):
+def test_make_html_with_events(sample_event_data, fixed_datetime, mock_db_connection, monkeypatch):
     """Test HTML email generation with events"""
-    from src.events_alerts import make_html
-
-    with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection):
-        with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
-            with patch('src.events_alerts.COMPANY_NAME', 'Test Company'):
-                with patch('src.events_alerts.EVENT_TYPE_ID', 18):
-                    with patch('src.events_alerts.EVENT_STATUS_ID', 3):
-                        with patch('src.events_alerts.EVENT_LOOKBACK_DAYS', 17):
-                            event_ids, html = make_html(sample_event_data, fixed_datetime)
-
-                            assert len(event_ids) == 2
-                            assert 101 in event_ids
-                            assert 102 in event_ids
-                            assert 'Hot Work Permit - Deck Maintenance' in html
-                            assert 'https://prominence.orca.tools/events/101' in html
-                            assert 'Test Company' in html
-                            assert '<!DOCTYPE html>' in html
-                            assert 'Status: Default Status' in html
-                            assert 'Type: Default Type' in html
+    monkeypatch.setattr(ea, 'get_db_connection', lambda: mock_db_connection)
+    monkeypatch.setattr(ea, 'load_sql_query', lambda *args: 'SELECT * FROM events')
+    monkeypatch.setattr(ea, 'COMPANY_NAME', 'Test Company')
+    monkeypatch.setattr(ea, 'EVENT_TYPE_ID', 18)
+    monkeypatch.setattr(ea, 'EVENT_STATUS_ID', 3)
+    monkeypatch.setattr(ea, 'EVENT_LOOKBACK_DAYS', 17)
+
+    event_ids, html = ea.make_html(sample_event_data, fixed_datetime)
+
+    assert len(event_ids) == 2
+    assert 101 in event_ids
+    assert 102 in event_ids
+    assert 'Hot Work Permit - Deck Maintenance' in html
+    assert 'https://prominence.orca.tools/events/101' in html
+    assert 'Test Company' in html
+    assert '<!DOCTYPE html>' in html
+    assert 'Status: Default Status' in html
+    assert 'Type: Default Type' in html
 
 
 def test_make_html_empty(empty_event_data, fixed_datetime, mock_db_connection):
     """Test HTML email generation with no events"""
-    from src.events_alerts import make_html
 
     with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection):
         with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
-            event_ids, html = make_html(empty_event_data, fixed_datetime)
+            event_ids, html = ea.make_html(empty_event_data, fixed_datetime)
 
             assert event_ids == []
             assert 'No events found' in html
@@ -98,12 +134,11 @@ def test_make_html_empty(empty_event_data, fixed_datetime, mock_db_connection):
 
 def test_make_html_with_logos(sample_event_data, fixed_datetime, mock_db_connection, temp_project_root):
     """Test HTML generation with logo flags"""
-    from src.events_alerts import make_html
 
     with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection):
         with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
             with patch('src.events_alerts.COMPANY_NAME', 'Test Company'):
-                event_ids, html = make_html(
+                event_ids, html = ea.make_html(
                     sample_event_data,
                     fixed_datetime,
                     has_company_logo=True,
@@ -114,22 +149,37 @@ def test_make_html_with_logos(sample_event_data, fixed_datetime, mock_db_connect
                 assert 'cid:st_company_logo' in html
 
 
-def test_make_html_lookback_days_plural(sample_event_data, fixed_datetime, mock_db_connection):
+def test_make_html_lookback_days_plural(sample_event_data, fixed_datetime, mock_db_connection, monkeypatch):
     """Test HTML shows correct singular/plural for lookback days"""
-    from src.events_alerts import make_html
-    
+    monkeypatch.setattr(ea, 'get_db_connection', lambda: mock_db_connection)
+    monkeypatch.setattr(ea, 'load_sql_query', lambda *args: 'SELECT * FROM events')
+    monkeypatch.setattr(ea, 'COMPANY_NAME', 'Test Company')
+    monkeypatch.setattr(ea, 'EVENT_TYPE_ID', 18)
+    monkeypatch.setattr(ea, 'EVENT_STATUS_ID', 3)
+
+    # Test plural (17 days)
+    monkeypatch.setattr(ea, 'EVENT_LOOKBACK_DAYS', 17)
+    event_ids, html = ea.make_html(sample_event_data, fixed_datetime)
+    assert '17 days' in html
+
+    # Test singular (1 day)
+    monkeypatch.setattr(ea, 'EVENT_LOOKBACK_DAYS', 1)
+    event_ids, html = ea.make_html(sample_event_data, fixed_datetime)
+    assert '1 day' in html
+    assert '1 days' not in html
+
+
+def test_wrap_html_subset_matches_make_html(sample_event_data, fixed_datetime, mock_db_connection):
+    """Test slicing rows rendered once gives the same HTML as rendering the subset"""
+
     with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection):
         with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
-            with patch('src.events_alerts.COMPANY_NAME', 'Test Company'):
-                with patch('src.events_alerts.EVENT_TYPE_ID', 18):
-                    with patch('src.events_alerts.EVENT_STATUS_ID', 3):
-                        # Test plural (17 days)
-                        with patch('src.events_alerts.EVENT_LOOKBACK_DAYS', 17):
-                            event_ids, html = make_html(sample_event_data, fixed_datetime)
-                            assert '17 days' in html
-                        
-                        # Test singular (1 day)
-                        with patch('src.events_alerts.EVENT_LOOKBACK_DAYS', 1):
-                            event_ids, html = make_html(sample_event_data, fixed_datetime)
-                            assert '1 day' in html
-                            assert '1 days' not in html
+            row_html = dict(zip(sample_event_data.index, ea.render_rows(sample_event_data)))
+            subset = sample_event_data[sample_event_data['id'] == 102]
+
+            html = ea.wrap_html([row_html[i] for i in subset.index], subset.columns, fixed_datetime)
+            event_ids, expected = ea.make_html(subset, fixed_datetime)
+
+            assert event_ids == [102]
+            assert html == expected
+            assert 'events/101' not in html
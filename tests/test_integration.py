@@ -4,58 +4,141 @@ Integration tests for the complete workflow
 """
 import pytest
 from unittest.mock import patch, MagicMock
+import json
+import smtplib
 import pandas as pd
 
+from src import events_alerts as ea
+
+
+@pytest.fixture(scope='module', autouse=True)
+def stub_sql_queries():
+    """Serve every query file as a fixed statement, patched once for the whole module"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(ea, 'load_sql_query', lambda query_file='VesselAttendances.sql': 'SELECT * FROM events')
+        yield
+
+
+def test_fetch_events_streams_without_changing_conn(monkeypatch):
+    """Test the streamed read leaves the caller's connection options untouched"""
+    sqlalchemy = pytest.importorskip('sqlalchemy')
+    monkeypatch.setattr(ea, 'HAS_CONNECTORX', False)
+    monkeypatch.setattr(ea, 'EVENTS_QUERY_CHUNKSIZE', 2)
+    engine = sqlalchemy.create_engine('sqlite://')
+
+    with engine.connect() as conn:
+        conn.execute(sqlalchemy.text('CREATE TABLE events (id INTEGER, type_id INTEGER)'))
+        conn.execute(sqlalchemy.text('INSERT INTO events VALUES (1, 7), (2, 7), (3, 7), (4, 8)'))
+
+        df = ea.fetch_events(conn, 'SELECT id FROM events WHERE type_id = :type_id', {'type_id': 7})
+
+        assert list(df['id']) == [1, 2, 3]
+        assert 'stream_results' not in conn.get_execution_options()
+
+
+@pytest.mark.parametrize('backslash_escapes,literal', [
+    (False, "'C:\\temp\\_it''s 100%'"),
+    (True, "'C:\\\\temp\\\\_it''s 100%'"),
+], ids=['standard_conforming_strings_on', 'standard_conforming_strings_off'])
+def test_fetch_events_connectorx_renders_literals(monkeypatch, backslash_escapes, literal):
+    """Test the connectorx read inlines params quoted for the connection's server"""
+    pa = pytest.importorskip('pyarrow')
+    from sqlalchemy.dialects import postgresql
+    from src import db_utils
+    cx = MagicMock()
+    cx.read_sql.return_value = pa.table({'id': [1]})
+    monkeypatch.setattr(db_utils, 'cx', cx)
+    monkeypatch.setattr(ea, 'HAS_CONNECTORX', True)
+    conn = MagicMock()
+    conn.dialect = postgresql.dialect()
+    conn.dialect._backslash_escapes = backslash_escapes
+
+    df = ea.fetch_events(conn, 'SELECT id FROM events WHERE note ILIKE :pattern', {'pattern': "C:\\temp\\_it's 100%"})
+
+    assert list(df['id']) == [1]
+    rendered = cx.read_sql.call_args.args[1]
+    assert rendered == f"SELECT id FROM events WHERE note ILIKE {literal}"
+
+
+def main_config(sent_events_file, events, conn, local_tz):
+    """events_alerts attributes for a main() run that emails INTERNAL_RECIPIENTS only"""
+    return {
+        'SENT_EVENTS_FILE': sent_events_file,
+        'get_db_connection': lambda: conn,
+        'config': lambda *args, **kwargs: 'events.sql',
+        'fetch_events': lambda *args, **kwargs: events,
+        'LOCAL_TZ': local_tz,
+        'load_logo': lambda *args: (None, None, None),
+        'ENABLE_EMAIL_ALERTS': True,
+        'ENABLE_TEAMS_ALERTS': False,
+        'ENABLE_SPECIAL_TEAMS_EMAIL_ALERT': False,
+        'INTERNAL_RECIPIENTS': ['test@test.com'],
+        'EVENT_STATUS_ID': 3,
+    }
+
+
+@pytest.fixture
+def new_events(sample_event_data):
+    """Events as joined by the events query, for vessels outside both recipient groups"""
+    return sample_event_data.assign(
+        email='master@vessel.com',
+        type_name='Hot Work Permit',
+        status_name='For Review'
+    )
+
 
-'''
-THIS TEST NEEDS UPDATING
 def test_main_flow_with_new_events(
     temp_project_root,
-    sample_event_data,
+    new_events,
     mock_db_connection,
     mock_smtp,
     mock_smtp_class,
-    fixed_datetime,
+    smtp_ssl_env,
+    frozen_time,
     local_tz
 ):
     """Test complete main() flow with new events"""
-    from src.events_alerts import main
 
     sent_events_file = temp_project_root / 'data' / 'sent_events.json'
+    cfg = main_config(sent_events_file, new_events, mock_db_connection, local_tz)
+
+    with patch.multiple(ea, **cfg), patch('smtplib.SMTP_SSL', mock_smtp_class):
+        ea.main()
+
+    # Verify email was sent
+    assert len(mock_smtp.sent) == 1
+
+    # Verify sent_events.json was created
+    assert sent_events_file.exists()
+
+    # Verify the content of sent_events.json
+    data = json.loads(sent_events_file.read_bytes())
+    assert '101' in data['sent_events']
+    assert '102' in data['sent_events']
+    # Verify total_count is NOT in the file
+    assert 'total_count' not in data
+
+
+def test_main_flow_notification_failure(
+    temp_project_root,
+    new_events,
+    mock_db_connection,
+    smtp_ssl_env,
+    frozen_time,
+    local_tz,
+    caplog
+):
+    """Test main() flow when notification fails"""
+
+    sent_events_file = temp_project_root / 'data' / 'sent_events.json'
+    cfg = main_config(sent_events_file, new_events, mock_db_connection, local_tz)
 
-    with patch('src.events_alerts.SENT_EVENTS_FILE', sent_events_file):
-        with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection):
-            with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
-                with patch('src.events_alerts.LOCAL_TZ', local_tz):
-                    with patch('pandas.read_sql_query', return_value=sample_event_data):
-                        with patch('smtplib.SMTP_SSL', mock_smtp_class):
-                            with patch('src.events_alerts.load_logo', return_value=(None, None, None)):
-                                with patch('src.events_alerts.ENABLE_EMAIL_ALERTS', True):
-                                    with patch('src.events_alerts.ENABLE_TEAMS_ALERTS', False):
-                                        with patch('src.events_alerts.ENABLE_SPECIAL_TEAMS_EMAIL_ALERT', False):
-                                            with patch('src.events_alerts.INTERNAL_RECIPIENTS', ['test@test.com']):
-                                                with patch('src.events_alerts.SMTP_PORT', 465):
-                                                    with patch('src.events_alerts.SMTP_HOST', 'smtp.test.com'):
-                                                        with patch('src.events_alerts.SMTP_USER', 'test@test.com'):
-                                                            with patch('src.events_alerts.SMTP_PASS', 'password'):
-                                                                with patch('src.events_alerts.EVENT_STATUS_ID', 3):
-                                                                    main()
-
-                                                                    # Verify email was sent
-                                                                    mock_smtp.send_message.assert_called_once()
-
-                                                                    # Verify sent_events.json was created
-                                                                    assert sent_events_file.exists()
-
-                                                                    # Verify the content of sent_events.json
-                                                                    import json
-                                                                    with open(sent_events_file, 'r') as f:
-                                                                        data = json.load(f)
-                                                                    assert '101' in data['sent_events']
-                                                                    assert '102' in data['sent_events']
-                                                                    # Verify total_count is NOT in the file
-                                                                    assert 'total_count' not in data
-'''
+    with patch.multiple(ea, **cfg), patch('smtplib.SMTP_SSL', side_effect=smtplib.SMTPException('Failed')):
+        ea.main()
+
+    # Events should NOT be marked as sent
+    assert 'Internal email sending failed: Failed' in caplog.text
+    assert not sent_events_file.exists()
 
 
 def test_main_flow_all_events_already_sent(
@@ -63,83 +146,100 @@ def test_main_flow_all_events_already_sent(
     sample_event_data,
     sent_events_json,
     mock_db_connection,
-    fixed_datetime,
-    local_tz
+    frozen_time,
+    local_tz,
+    monkeypatch
 ):
     """Test main() flow when all events already sent"""
-    from src.events_alerts import main
     
     # Add sample event IDs to sent events
     sent_events = {101: '2025-10-29T08:00:00+02:00', 102: '2025-10-29T09:30:00+02:00'}
-    
-    with patch('src.events_alerts.SENT_EVENTS_FILE', sent_events_json):
-        with patch('src.events_alerts.load_sent_events', return_value=sent_events):
-            with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection):
-                with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
-                    with patch('src.events_alerts.LOCAL_TZ', local_tz):
-                        with patch('pandas.read_sql_query', return_value=sample_event_data):
-                            with patch('datetime.datetime') as mock_datetime:
-                                mock_datetime.now.return_value = fixed_datetime
-                                
-                                # Should exit early without sending notifications
-                                main()
+
+    monkeypatch.setattr(ea, 'SENT_EVENTS_FILE', sent_events_json)
+    monkeypatch.setattr(ea, '_read_sent_events', lambda *args, **kwargs: (sent_events, 0))
+    monkeypatch.setattr(ea, 'get_db_connection', lambda: mock_db_connection)
+    monkeypatch.setattr(ea, 'LOCAL_TZ', local_tz)
+    monkeypatch.setattr(ea, 'fetch_events', lambda *args, **kwargs: sample_event_data)
+
+    # Should exit early without sending notifications
+    ea.main()
 
 
 def test_main_flow_no_events_found(
     temp_project_root,
     empty_event_data,
     mock_db_connection,
-    fixed_datetime,
-    local_tz
+    frozen_time,
+    local_tz,
+    monkeypatch
 ):
     """Test main() flow when query returns no events"""
-    from src.events_alerts import main
     
     sent_events_file = temp_project_root / 'data' / 'sent_events.json'
-    
-    with patch('src.events_alerts.SENT_EVENTS_FILE', sent_events_file):
-        with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection):
-            with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
-                with patch('src.events_alerts.LOCAL_TZ', local_tz):
-                    with patch('pandas.read_sql_query', return_value=empty_event_data):
-                        with patch('datetime.datetime') as mock_datetime:
-                            mock_datetime.now.return_value = fixed_datetime
-                            
-                            # Should exit early without sending notifications
-                            main()
-
-
-'''
-THIS TEST NEEDS UPDATING
-def test_main_flow_notification_failure(
+
+    monkeypatch.setattr(ea, 'SENT_EVENTS_FILE', sent_events_file)
+    monkeypatch.setattr(ea, 'get_db_connection', lambda: mock_db_connection)
+    monkeypatch.setattr(ea, 'LOCAL_TZ', local_tz)
+    monkeypatch.setattr(ea, 'fetch_events', lambda *args, **kwargs: empty_event_data)
+
+    # Should exit early without sending notifications
+    ea.main()
+
+
+def test_main_flow_no_events_persists_cleanup(
+    temp_project_root,
+    empty_event_data,
+    mock_db_connection,
+    frozen_time,
+    local_tz,
+    old_and_recent_payload,
+    monkeypatch
+):
+    """Test expired entries are written back even when the run has nothing to send"""
+    sent_events_file = temp_project_root / 'data' / 'sent_events.json'
+    sent_events_file.write_bytes(old_and_recent_payload)
+
+    monkeypatch.setattr(ea, 'SENT_EVENTS_FILE', sent_events_file)
+    monkeypatch.setattr(ea, 'REMINDER_FREQUENCY_DAYS', 30.0)
+    monkeypatch.setattr(ea, 'get_db_connection', lambda: mock_db_connection)
+    monkeypatch.setattr(ea, 'LOCAL_TZ', local_tz)
+    monkeypatch.setattr(ea, 'fetch_events', lambda *args, **kwargs: empty_event_data)
+
+    ea.main()
+
+    saved = json.loads(sent_events_file.read_text())
+    assert list(saved['sent_events']) == ['501']
+
+
+def test_main_flow_all_alerts_disabled(
     temp_project_root,
     sample_event_data,
     mock_db_connection,
-    fixed_datetime,
-    local_tz
+    local_tz,
+    caplog,
+    monkeypatch
 ):
-    """Test main() flow when notification fails"""
-    from src.events_alerts import main
-    import smtplib
-    
+    """Test main() stops before rendering or lookups when every alert channel is off"""
+
     sent_events_file = temp_project_root / 'data' / 'sent_events.json'
-    
-    with patch('src.events_alerts.SENT_EVENTS_FILE', sent_events_file):
-        with patch('src.events_alerts.get_db_connection', return_value=mock_db_connection):
-            with patch('src.events_alerts.load_sql_query', return_value='SELECT * FROM events'):
-                with patch('src.events_alerts.LOCAL_TZ', local_tz):
-                    with patch('pandas.read_sql_query', return_value=sample_event_data):
-                        with patch('smtplib.SMTP_SSL', side_effect=smtplib.SMTPException('Failed')):
-                            with patch('src.events_alerts.load_logo', return_value=(None, None, None)):
-                                with patch('src.events_alerts.ENABLE_EMAIL_ALERTS', True):
-                                    with patch('src.events_alerts.ENABLE_TEAMS_ALERTS', False):
-                                        with patch('src.events_alerts.ENABLE_SPECIAL_TEAMS_EMAIL_ALERT', False):
-                                            with patch('src.events_alerts.INTERNAL_RECIPIENTS', ['test@test.com']):
-                                                with patch('datetime.datetime') as mock_datetime:
-                                                    mock_datetime.now.return_value = fixed_datetime
-                                                    
-                                                    main()
-                                                    
-                                                    # Events should NOT be marked as sent
-                                                    # sent_events.json should either not exist or be empty
-'''
+    events = sample_event_data.assign(email=['master@prominence.com', 'master@seatraders.com'])
+    mock_wrap = MagicMock()
+
+    monkeypatch.setattr(ea, 'SENT_EVENTS_FILE', sent_events_file)
+    monkeypatch.setattr(ea, 'get_db_connection', lambda: mock_db_connection)
+    monkeypatch.setattr(ea, 'config', lambda *args, **kwargs: 'events.sql')
+    monkeypatch.setattr(ea, 'LOCAL_TZ', local_tz)
+    monkeypatch.setattr(ea, 'fetch_events', lambda *args, **kwargs: events)
+    monkeypatch.setattr(ea, 'ENABLE_EMAIL_ALERTS', False)
+    monkeypatch.setattr(ea, 'ENABLE_TEAMS_ALERTS', False)
+    monkeypatch.setattr(ea, 'ENABLE_SPECIAL_TEAMS_EMAIL_ALERT', False)
+    monkeypatch.setattr(ea, 'wrap_html', mock_wrap)
+
+    with caplog.at_level('INFO', logger='events_alerts'):
+        ea.main()
+
+    assert 'All alerts disabled; would notify 2 event(s)' in caplog.text
+    # No type/status lookup, no rendering, nothing marked as sent
+    mock_db_connection.execute.assert_not_called()
+    mock_wrap.assert_not_called()
+    assert not sent_events_file.exists()
@@ -5,160 +5,158 @@ Tests for notification sending functionality
 import pytest
 from unittest.mock import patch, MagicMock, Mock, call
 import smtplib
+import requests
 
+from src import events_alerts as ea
 
-def test_send_email_success_ssl(mock_smtp):
-    """Test successful email sending via SSL"""
-    from src.events_alerts import send_email
 
-    with patch('src.events_alerts.SMTP_PORT', 465):
-        with patch('src.events_alerts.SMTP_HOST', 'smtp.test.com'):
-            with patch('src.events_alerts.SMTP_USER', 'test@test.com'):
-                with patch('src.events_alerts.SMTP_PASS', 'password'):
-                    with patch('smtplib.SMTP_SSL', return_value=mock_smtp):
-                        with patch('src.events_alerts.load_logo', return_value=(None, None, None)):
+@pytest.mark.parametrize("env,smtp_class,starttls_calls", [
+    ('smtp_ssl_env', 'SMTP_SSL', 0),
+    ('smtp_starttls_env', 'SMTP', 1),
+], ids=['ssl', 'starttls'])
+def test_send_email_success(env, smtp_class, starttls_calls, request, mock_smtp, mock_smtp_class, monkeypatch):
+    """Test successful email sending via SSL (port 465) and STARTTLS (port 587)"""
+    request.getfixturevalue(env)
+    monkeypatch.setattr(smtplib, smtp_class, mock_smtp_class)
+    monkeypatch.setattr(ea, 'load_logo', lambda *args: (None, None, None))
 
-                            send_email(
-                                'Test Subject',
-                                'Plain text',
-                                '<html>HTML content</html>',
-                                ['recipient@test.com']
-                            )
+    ea.send_email(
+        'Test Subject',
+        'Plain text',
+        '<html>HTML content</html>',
+        ['recipient@test.com']
+    )
 
-                            mock_smtp.login.assert_called_once()
-                            mock_smtp.send_message.assert_called_once()
+    assert len(mock_smtp.connections) == 1
+    assert mock_smtp.starttls_calls == starttls_calls
+    # STARTTLS greets the server before and after the upgrade
+    assert mock_smtp.ehlo_calls == 2 * starttls_calls
+    assert mock_smtp.login_calls == 1
+    assert len(mock_smtp.sent) == 1
 
 
-def test_send_email_success_starttls(mock_smtp):
-    """Test successful email sending via STARTTLS"""
-    from src.events_alerts import send_email
+def test_send_email_delivered_over_starttls(smtp_server_env, monkeypatch):
+    """Test send_email delivers through the real smtplib STARTTLS + AUTH path to a fake server"""
+    monkeypatch.setattr(ea, 'load_logo', lambda *args: (None, None, None))
 
-    with patch('src.events_alerts.SMTP_PORT', 587):
-        with patch('src.events_alerts.SMTP_HOST', 'smtp.test.com'):
-            with patch('src.events_alerts.SMTP_USER', 'test@test.com'):
-                with patch('src.events_alerts.SMTP_PASS', 'password'):
-                    with patch('smtplib.SMTP', return_value=mock_smtp):
-                        with patch('src.events_alerts.load_logo', return_value=(None, None, None)):
+    ea.send_email(
+        'Test Subject',
+        'Plain text',
+        '<html>HTML content</html>',
+        ['a@test.com', 'b@test.com']
+    )
 
-                            send_email(
-                                'Test Subject',
-                                'Plain text',
-                                '<html>HTML content</html>',
-                                ['recipient@test.com']
-                            )
+    assert len(smtp_server_env.envelopes) == 1
+    envelope = smtp_server_env.envelopes[0]
+    assert envelope.mail_from == 'test@test.com'
+    assert envelope.rcpt_tos == ['a@test.com', 'b@test.com']
+    assert b'Subject: Test Subject' in envelope.original_content
 
-                            mock_smtp.ehlo.assert_called()
-                            mock_smtp.starttls.assert_called_once()
-                            mock_smtp.login.assert_called_once()
-                            mock_smtp.send_message.assert_called_once()
 
+def test_send_email_reuses_smtp_session(smtp_ssl_env, mock_smtp, mock_smtp_class, monkeypatch):
+    """Test several emails share one SMTP connection and login"""
+    monkeypatch.setattr(smtplib, 'SMTP_SSL', mock_smtp_class)
+    monkeypatch.setattr(ea, 'load_logo', lambda *args: (None, None, None))
 
-def test_send_email_no_recipients():
-    """Test email sending with no recipients"""
-    from src.events_alerts import send_email
+    with ea.SmtpSession() as smtp:
+        for recipient in ['a@test.com', 'b@test.com', 'c@test.com']:
+            ea.send_email('Test Subject', 'Plain text', '<html>HTML content</html>', [recipient], smtp)
 
-    # Should not raise exception, just log warning
-    send_email(
-        'Test Subject',
-        'Plain text',
-        '<html>HTML content</html>',
-        []
-    )
+    assert len(mock_smtp.connections) == 1
+    assert mock_smtp.login_calls == 1
+    assert len(mock_smtp.sent) == 3
+    assert mock_smtp.quit_calls == 1
 
 
-def test_send_email_with_logos(mock_smtp, temp_project_root):
+def test_send_email_with_logos(smtp_ssl_env, mock_smtp, mock_smtp_class, temp_project_root, monkeypatch):
     """Test email sending with embedded logos"""
-    from src.events_alerts import send_email
 
     # Create fake logo file
     logo_file = temp_project_root / 'media' / 'logo.png'
     logo_file.write_bytes(b'fake image data')
 
-    with patch('src.events_alerts.SMTP_PORT', 465):
-        with patch('src.events_alerts.SMTP_HOST', 'smtp.test.com'):
-            with patch('src.events_alerts.SMTP_USER', 'test@test.com'):
-                with patch('src.events_alerts.SMTP_PASS', 'password'):
-                    with patch('src.events_alerts.COMPANY_LOGO', logo_file):
-                        with patch('src.events_alerts.ST_COMPANY_LOGO', logo_file):
-                            with patch('smtplib.SMTP_SSL', return_value=mock_smtp):
+    monkeypatch.setattr(ea, 'COMPANY_LOGO', logo_file)
+    monkeypatch.setattr(ea, 'ST_COMPANY_LOGO', logo_file)
+    monkeypatch.setattr(smtplib, 'SMTP_SSL', mock_smtp_class)
 
-                                send_email(
-                                    'Test Subject',
-                                    'Plain text',
-                                    '<html>HTML content</html>',
-                                    ['recipient@test.com']
-                                )
+    ea.send_email(
+        'Test Subject',
+        'Plain text',
+        '<html>HTML content</html>',
+        ['recipient@test.com']
+    )
 
-                                mock_smtp.send_message.assert_called_once()
+    assert len(mock_smtp.sent) == 1
 
 
-def test_send_email_connection_failure():
+def test_send_email_connection_failure(smtp_ssl_env, monkeypatch):
     """Test email sending with connection failure"""
-    from src.events_alerts import send_email
-
-    with patch('src.events_alerts.SMTP_PORT', 465):
-        with patch('src.events_alerts.SMTP_HOST', 'smtp.test.com'):
-            with patch('src.events_alerts.SMTP_USER', 'test@test.com'):
-                with patch('src.events_alerts.SMTP_PASS', 'password'):
-                    with patch('smtplib.SMTP_SSL', side_effect=smtplib.SMTPException('Connection failed')):
-                        with patch('src.events_alerts.load_logo', return_value=(None, None, None)):
+    monkeypatch.setattr(smtplib, 'SMTP_SSL', MagicMock(side_effect=smtplib.SMTPException('Connection failed')))
+    monkeypatch.setattr(ea, 'load_logo', lambda *args: (None, None, None))
 
-                            with pytest.raises(smtplib.SMTPException):
-                                send_email(
-                                    'Test Subject',
-                                    'Plain text',
-                                    '<html>HTML content</html>',
-                                    ['recipient@test.com']
-                                )
+    with pytest.raises(smtplib.SMTPException):
+        ea.send_email(
+            'Test Subject',
+            'Plain text',
+            '<html>HTML content</html>',
+            ['recipient@test.com']
+        )
 
 
-def test_send_teams_message_success(sample_event_data, fixed_datetime):
+def test_send_teams_message_success(sample_event_data, fixed_datetime, mock_teams_webhook, monkeypatch):
     """Test successful Teams message sending"""
-    from src.events_alerts import send_teams_message
+    monkeypatch.setattr(ea, 'TEAMS_WEBHOOK_URL', 'https://test.webhook.url')
+    monkeypatch.setattr(ea, '_teams_session', lambda: mock_teams_webhook)
+    monkeypatch.setattr(ea, 'COMPANY_NAME', 'Test Company')
+    monkeypatch.setattr(ea, 'EVENT_LOOKBACK_DAYS', 17)
+    monkeypatch.setattr(ea, 'SCHEDULE_FREQUENCY', 1)
 
-    mock_card = MagicMock()
-    mock_card.send.return_value = True
-    mock_card.last_http_response = MagicMock()
-    mock_card.last_http_response.status_code = 200
+    ea.send_teams_message(sample_event_data, fixed_datetime)
 
-    with patch('src.events_alerts.TEAMS_WEBHOOK_URL', 'https://test.webhook.url'):
-        with patch('pymsteams.connectorcard', return_value=mock_card):
-            with patch('src.events_alerts.COMPANY_NAME', 'Test Company'):
-                with patch('src.events_alerts.EVENT_LOOKBACK_DAYS', 17):
-                    with patch('src.events_alerts.SCHEDULE_FREQUENCY', 1):
+    assert len(mock_teams_webhook.posts) == 1
+    card = mock_teams_webhook.posts[0]['json']
+    assert card['title'] == 'AlertDev | 2 Permit Events Found'
+    assert len(card['sections']) == 3
 
-                        send_teams_message(sample_event_data, fixed_datetime)
 
-                        mock_card.title.assert_called()
-                        mock_card.addSection.assert_called()
-                        mock_card.send.assert_called_once()
+def test_send_teams_message_empty_df(empty_event_data, fixed_datetime, mock_teams_webhook, monkeypatch):
+    """Test Teams message with empty DataFrame"""
+    monkeypatch.setattr(ea, 'TEAMS_WEBHOOK_URL', 'https://test.webhook.url')
+    monkeypatch.setattr(ea, '_teams_session', lambda: mock_teams_webhook)
+    monkeypatch.setattr(ea, 'EVENT_LOOKBACK_DAYS', 17)
 
+    ea.send_teams_message(empty_event_data, fixed_datetime)
+
+    assert len(mock_teams_webhook.posts) == 1
 
-def test_send_teams_message_empty_df(empty_event_data, fixed_datetime):
-    """Test Teams message with empty DataFrame"""
-    from src.events_alerts import send_teams_message
 
-    mock_card = MagicMock()
-    mock_card.send.return_value = True
-    mock_card.last_http_response = MagicMock()
-    mock_card.last_http_response.status_code = 200
+def test_send_teams_message_http_error(sample_event_data, fixed_datetime, mock_teams_webhook, monkeypatch):
+    """Test Teams message raises when the webhook rejects the card"""
+    mock_teams_webhook.response.error = requests.HTTPError('400 Bad Request')
+    monkeypatch.setattr(ea, 'TEAMS_WEBHOOK_URL', 'https://test.webhook.url')
+    monkeypatch.setattr(ea, '_teams_session', lambda: mock_teams_webhook)
 
-    with patch('src.events_alerts.TEAMS_WEBHOOK_URL', 'https://test.webhook.url'):
-        with patch('pymsteams.connectorcard', return_value=mock_card):
-            with patch('src.events_alerts.EVENT_LOOKBACK_DAYS', 17):
+    with pytest.raises(requests.HTTPError):
+        ea.send_teams_message(sample_event_data, fixed_datetime)
 
-                send_teams_message(empty_event_data, fixed_datetime)
 
-                mock_card.send.assert_called_once()
+def test_send_teams_message_delivery_failed(sample_event_data, fixed_datetime, mock_teams_webhook, monkeypatch):
+    """Test Teams message raises when a legacy connector answers 200 with an error text"""
+    mock_teams_webhook.response.text = 'Webhook message delivery failed with error: Microsoft Teams endpoint returned HTTP error 429'
+    monkeypatch.setattr(ea, 'TEAMS_WEBHOOK_URL', 'https://test.webhook.url')
+    monkeypatch.setattr(ea, '_teams_session', lambda: mock_teams_webhook)
 
+    with pytest.raises(requests.HTTPError, match='delivery failed'):
+        ea.send_teams_message(sample_event_data, fixed_datetime)
 
-def test_send_teams_message_no_webhook():
-    """Test Teams message when webhook URL not configured"""
-    from src.events_alerts import send_teams_message
-    import pandas as pd
-    from datetime import datetime
-    from zoneinfo import ZoneInfo
 
-    with patch('src.events_alerts.TEAMS_WEBHOOK_URL', ''):
-        # Should not raise exception, just log warning
-        send_teams_message(pd.DataFrame(), datetime.now(tz=ZoneInfo('Europe/Athens')))
+@pytest.mark.parametrize("send", [
+    lambda events, run_time: ea.send_email('Test Subject', 'Plain text', '<html>HTML content</html>', []),
+    lambda events, run_time: ea.send_teams_message(events, run_time),
+], ids=['email_no_recipients', 'teams_no_webhook'])
+def test_send_without_destination(send, empty_event_data, fixed_datetime, monkeypatch):
+    """Test sends with no recipients / no webhook URL configured return early"""
+    monkeypatch.setattr(ea, 'TEAMS_WEBHOOK_URL', '')
+
+    # Should not raise exception, just log warning
+    send(empty_event_data, fixed_datetime)
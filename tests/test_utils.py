@@ -2,76 +2,166 @@
 """
 Tests for utility functions
 """
+import os
 import pytest
 from pathlib import Path
 from unittest.mock import patch, mock_open
 
+from src import events_alerts as ea
 
-def test_load_logo_exists(temp_project_root):
-    """Test loading existing logo file"""
-    from src.events_alerts import load_logo
 
-    logo_file = temp_project_root / 'media' / 'test_logo.png'
-    logo_file.write_bytes(b'fake png data')
+@pytest.fixture
+def temp_project_root(fs_module, request):
+    """In-memory project structure (pyfakefs): logo and query files never touch the disk"""
+    # One fake filesystem per module, so each test gets its own tree inside it
+    root = Path('/project') / request.node.name
+    for subdir in ('data', 'logs', 'queries', 'media'):
+        fs_module.create_dir(root / subdir)
+
+    return root
+
+
+@pytest.fixture(scope='module')
+def logo_files(fs_module):
+    """Read-only logo files of every tested format, written once per module"""
+    media = Path('/fixtures/media')
+    files = {}
+    for filename in ('test.jpg', 'test.jpeg', 'test.gif', 'test.svg', 'test_logo.png'):
+        fs_module.create_file(media / filename, contents=b'fake image data')
+        files[filename] = media / filename
+    return files
+
+
+def test_load_logo_exists(logo_files):
+    """Test loading existing logo file"""
 
-    data, mime_type, filename = load_logo(logo_file)
+    data, mime_type, filename = ea.load_logo(logo_files['test_logo.png'])
 
-    assert data == b'fake png data'
+    assert data == b'fake image data'
     assert mime_type == 'image/png'
     assert filename == 'test_logo.png'
 
 
 def test_load_logo_not_exists(temp_project_root):
     """Test loading non-existent logo file"""
-    from src.events_alerts import load_logo
 
     logo_file = temp_project_root / 'media' / 'nonexistent.png'
 
-    data, mime_type, filename = load_logo(logo_file)
+    data, mime_type, filename = ea.load_logo(logo_file)
 
     assert data is None
     assert mime_type is None
     assert filename is None
 
 
-def test_load_logo_different_formats(temp_project_root):
+def test_load_logo_reloads_changed_file(temp_project_root):
+    """Test logo bytes are cached until the file changes"""
+    logo_file = temp_project_root / 'media' / 'test_logo.png'
+    logo_file.write_bytes(b'old logo')
+    assert ea.load_logo(logo_file)[0] == b'old logo'
+
+    with patch('builtins.open', side_effect=AssertionError('logo re-read from disk')):
+        assert ea.load_logo(logo_file)[0] == b'old logo'
+
+    logo_file.write_bytes(b'new logo')
+    stat = logo_file.stat()
+    os.utime(logo_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert ea.load_logo(logo_file)[0] == b'new logo'
+
+
+def test_load_logo_rereads_file_caught_mid_write(temp_project_root):
+    """Test a partly written logo is not served from the cache once the write completes"""
+    logo_file = temp_project_root / 'media' / 'test_logo.png'
+    logo_file.write_bytes(b'partial')
+    stat = logo_file.stat()
+    assert ea.load_logo(logo_file)[0] == b'partial'
+
+    # Same mtime (coarse timestamps), only the size tells the two versions apart
+    logo_file.write_bytes(b'partial logo data')
+    os.utime(logo_file, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert ea.load_logo(logo_file)[0] == b'partial logo data'
+
+
+def test_read_logo_short_read_not_cached(temp_project_root):
+    """Test a read that does not match the stat'd size raises instead of being cached"""
+    logo_file = temp_project_root / 'media' / 'test_logo.png'
+    logo_file.write_bytes(b'truncated')
+    stat = logo_file.stat()
+
+    with pytest.raises(OSError, match='changed while reading'):
+        ea._read_logo(str(logo_file), stat.st_mtime_ns, stat.st_size + 100)
+
+    assert ea._read_logo.cache_info().currsize == 0
+
+
+@pytest.mark.parametrize("filename,expected_mime", [
+    ('test.jpg', 'image/jpeg'),
+    ('test.jpeg', 'image/jpeg'),
+    ('test.gif', 'image/gif'),
+    ('test.svg', 'image/svg+xml'),
+])
+def test_load_logo_different_formats(logo_files, filename, expected_mime):
     """Test loading different image formats"""
-    from src.events_alerts import load_logo
 
-    test_formats = [
-        ('test.jpg', 'image/jpeg'),
-        ('test.jpeg', 'image/jpeg'),
-        ('test.gif', 'image/gif'),
-        ('test.svg', 'image/svg+xml'),
-    ]
+    data, mime_type, name = ea.load_logo(logo_files[filename])
 
-    for filename, expected_mime in test_formats:
-        logo_file = temp_project_root / 'media' / filename
-        logo_file.write_bytes(b'fake image data')
+    assert mime_type == expected_mime
 
-        data, mime_type, name = load_logo(logo_file)
 
-        assert mime_type == expected_mime
+@pytest.fixture
+def patched_queries_dir(temp_project_root, monkeypatch):
+    """Point QUERIES_DIR at the temporary project's queries directory"""
+    queries_dir = temp_project_root / 'queries'
+    monkeypatch.setattr(ea, 'QUERIES_DIR', queries_dir)
+    return queries_dir
 
 
-def test_load_sql_query(temp_project_root):
+def test_load_sql_query(patched_queries_dir):
     """Test loading SQL query from file"""
-    from src.events_alerts import load_sql_query
 
-    query_file = temp_project_root / 'queries' / 'test_query.sql'
+    query_file = patched_queries_dir / 'test_query.sql'
     query_content = "SELECT * FROM events WHERE id = :id"
     query_file.write_text(query_content)
 
-    with patch('src.events_alerts.QUERIES_DIR', temp_project_root / 'queries'):
-        result = load_sql_query('test_query.sql')
+    result = ea.load_sql_query('test_query.sql')
 
-        assert result == query_content
+    assert result == query_content
 
 
-def test_load_sql_query_not_found(temp_project_root):
+def test_load_sql_query_not_found(patched_queries_dir):
     """Test loading non-existent SQL query file"""
-    from src.events_alerts import load_sql_query
 
-    with patch('src.events_alerts.QUERIES_DIR', temp_project_root / 'queries'):
-        with pytest.raises(FileNotFoundError):
-            load_sql_query('nonexistent.sql')
+    with pytest.raises(FileNotFoundError):
+        ea.load_sql_query('nonexistent.sql')
+
+
+def test_preload_sql_queries(patched_queries_dir):
+    """Test every .sql file is cached up front and later loads skip the disk"""
+    (patched_queries_dir / 'a.sql').write_text('SELECT 1')
+    (patched_queries_dir / 'b.sql').write_text('SELECT 2')
+    (patched_queries_dir / 'empty.sql').write_text('')
+    (patched_queries_dir / 'notes.txt').write_text('not a query')
+
+    assert ea.preload_sql_queries() == 2
+
+    with patch('src.events_alerts.validate_query_file', side_effect=AssertionError('query re-read from disk')):
+        assert ea.load_sql_query('a.sql') == 'SELECT 1'
+        assert ea.load_sql_query('b.sql') == 'SELECT 2'
+
+
+def test_preload_sql_queries_missing_dir(temp_project_root, monkeypatch):
+    """Test a missing queries directory is logged instead of stopping the scheduler"""
+    monkeypatch.setattr(ea, 'QUERIES_DIR', temp_project_root / 'missing')
+
+    assert ea.preload_sql_queries() == 0
+
+
+def test_duration_formats_hours():
+    """Test duration() output, including schedules of a day or more"""
+
+    assert ea.duration(1) == '1h'
+    assert ea.duration(1.5) == '1h 30m'
+    assert ea.duration(0.25) == '15m'
+    assert ea.duration(1 + 5 / 3600) == '1h 5s'
+    assert ea.duration(24) == '24h'
+    assert ea.duration(0) == '0s'